@@ -1,6 +1,28 @@
-from flask import Flask, request, render_template_string, redirect, url_for
+from flask import Flask, Response, request, render_template, redirect, url_for, jsonify, g
+import click
 import subprocess
 import sys
+import os
+import hashlib
+import http.client
+import importlib.util
+import json
+import math
+import socket
+import sqlite3
+import threading
+import time
+import codecs
+import queue
+import copy
+import contextvars
+import functools
+from bisect import bisect_left
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from jinja2.utils import htmlsafe_json_dumps
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeout
 from datetime import datetime, timezone
 
 app = Flask(__name__)
@@ -8,22 +30,718 @@ app = Flask(__name__)
 def install(package):
     subprocess.check_call([sys.executable, "-m", "pip", "install", package])
 
-for pkg in ["torch", "requests", "beautifulsoup4", "transformers", "duckduckgo-search"]:
-    try:
-        __import__(pkg if pkg != "beautifulsoup4" else "bs4")
-    except ImportError:
+# find_spec checks that a package is installed without importing it, so
+# torch and transformers are not loaded here; see get_summarizer.
+for pkg, module in [("torch", "torch"), ("requests", "requests"), ("beautifulsoup4", "bs4"),
+                    ("transformers", "transformers"), ("duckduckgo-search", "duckduckgo_search")]:
+    if importlib.util.find_spec(module) is None:
         install(pkg)
 
-import torch
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 from bs4 import BeautifulSoup
-from transformers import pipeline
 from duckduckgo_search import DDGS
-from urllib.parse import urlparse
+from urllib.parse import urljoin, urlparse
 import re
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-summarizer = pipeline("summarization", model="sshleifer/distilbart-cnn-12-6", device=0 if torch.cuda.is_available() else -1)
+app.logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+
+class StageHistograms:
+    # Prometheus-style latency histograms keyed by (stage, search_type).
+    # Bucket counts are stored per bucket and made cumulative on export.
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, search_type, seconds):
+        with self.lock:
+            series = self.series.get((stage, search_type))
+            if series is None:
+                series = self.series[(stage, search_type)] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, seconds)] += 1
+            series[1] += seconds
+
+    def render(self, name):
+        lines = [f"# HELP {name} Time spent in each stage of serving a search, by search type.",
+                 f"# TYPE {name} histogram"]
+        with self.lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self.series.items())
+        for (stage, search_type), counts, total in series:
+            labels = f'stage="{stage}",search_type="{search_type}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {sum(counts)}')
+            lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {sum(counts)}")
+        return lines
+
+stage_histograms = StageHistograms(METRICS_BUCKETS)
+
+class RequestTiming:
+    # Per-request stage totals for the Server-Timing header. Enrichment runs
+    # concurrently, so a stage's total can exceed the request's wall time.
+    def __init__(self, search_type):
+        self.search_type = search_type
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            total, count = self.stages.get(stage, (0.0, 0))
+            self.stages[stage] = (total + seconds, count + 1)
+
+    def header(self):
+        with self.lock:
+            return ", ".join(f'{stage};dur={total * 1000:.1f};desc="{count}x"' for stage, (total, count) in self.stages.items())
+
+# Set per request; FetchScheduler copies it into its worker threads so
+# enrichment tasks are tagged with the search type that started them.
+current_timing = contextvars.ContextVar("current_timing", default=None)
+
+def run_as(search_type, fn, *args):
+    # Work done for a search type outside its own request (prefetch, prewarm,
+    # batch API items) runs tagged with that type, so choose_summarizer and
+    # the stage histograms see the type the work is really for.
+    token = current_timing.set(RequestTiming(search_type))
+    try:
+        return fn(*args)
+    finally:
+        current_timing.reset(token)
+
+def record_stage(stage, seconds):
+    timing = current_timing.get()
+    stage_histograms.observe(stage, timing.search_type if timing else "none", seconds)
+    if timing is not None:
+        timing.add(stage, seconds)
+
+@contextmanager
+def stage_timer(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+def timed(stage):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+SUMMARIZER_MODEL = "sshleifer/distilbart-cnn-12-6"
+SUMMARY_PARAMS = {"max_length": 200, "min_length": 50, "do_sample": False}
+SUMMARIZER_BACKEND = os.environ.get("SUMMARIZER_BACKEND", "fp32")
+SUMMARIZER_ONNX_PATH = os.environ.get("SUMMARIZER_ONNX_PATH", "onnx/distilbart-cnn-12-6")
+
+def load_summarizer(backend=SUMMARIZER_BACKEND):
+    # Returns (pipeline, backend actually loaded). fp32: the stock pipeline.
+    # int8: dynamic quantization of every Linear layer, CPU only. onnx: ONNX
+    # Runtime through optimum, exported once to SUMMARIZER_ONNX_PATH and
+    # loaded from there afterwards.
+    import torch
+    from transformers import pipeline, AutoModelForSeq2SeqLM, AutoTokenizer
+    if backend == "int8":
+        model = AutoModelForSeq2SeqLM.from_pretrained(SUMMARIZER_MODEL)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return pipeline("summarization", model=model, tokenizer=AutoTokenizer.from_pretrained(SUMMARIZER_MODEL), device=-1), backend
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError:
+            app.logger.warning("SUMMARIZER_BACKEND=onnx needs optimum[onnxruntime]; falling back to fp32")
+            return load_summarizer("fp32")
+        if os.path.isdir(SUMMARIZER_ONNX_PATH):
+            model = ORTModelForSeq2SeqLM.from_pretrained(SUMMARIZER_ONNX_PATH)
+        else:
+            model = ORTModelForSeq2SeqLM.from_pretrained(SUMMARIZER_MODEL, export=True)
+            model.save_pretrained(SUMMARIZER_ONNX_PATH)
+        return pipeline("summarization", model=model, tokenizer=AutoTokenizer.from_pretrained(SUMMARIZER_MODEL)), backend
+    return pipeline("summarization", model=SUMMARIZER_MODEL, device=0 if torch.cuda.is_available() else -1), "fp32"
+
+# With SUMMARIZER_URL set (http://host:port or unix:///path/to.sock) this
+# process never loads the model; summaries come from the model server
+# started with `flask --app app model-server`.
+SUMMARIZER_URL = os.environ.get("SUMMARIZER_URL")
+SUMMARIZER_CLIENT_TIMEOUT = float(os.environ.get("SUMMARIZER_CLIENT_TIMEOUT", 30))
+
+# SUMMARIZER_WARMUP: "background" loads the model in a thread started by the
+# first request so / and non-summary searches are served meanwhile; "lazy"
+# waits for the first summary; "eager" loads before the module finishes
+# importing.
+SUMMARIZER_WARMUP = os.environ.get("SUMMARIZER_WARMUP", "background")
+
+summarizer = None
+summarizer_state = {"status": "remote" if SUMMARIZER_URL else "not_loaded", "error": None, "load_seconds": None,
+                    "backend": None}
+summarizer_lock = threading.Lock()
+
+def get_summarizer():
+    global summarizer
+    if summarizer is None:
+        with summarizer_lock:
+            if summarizer is None:
+                summarizer_state["status"] = "loading"
+                started = time.monotonic()
+                try:
+                    loaded, backend = load_summarizer()
+                except Exception as e:
+                    summarizer_state.update(status="failed", error=str(e))
+                    raise
+                summarizer_state.update(status="ready", error=None, load_seconds=round(time.monotonic() - started, 2),
+                                        backend=backend)
+                summarizer = loaded
+    return summarizer
+
+def warm_summarizer():
+    try:
+        get_summarizer()
+    except Exception as e:
+        app.logger.exception("Error loading summarizer: %s", e)
+
+warmup_thread = None
+warmup_lock = threading.Lock()
+
+def start_warmup():
+    # Not at import: under gunicorn --preload the workers would fork with
+    # summarizer_lock held by a thread that does not exist in them.
+    global warmup_thread
+    if warmup_thread is None:
+        with warmup_lock:
+            if warmup_thread is None:
+                warmup_thread = threading.Thread(target=warm_summarizer, name="summarizer-warmup", daemon=True)
+                warmup_thread.start()
+
+if not SUMMARIZER_URL and SUMMARIZER_WARMUP == "eager":
+    warm_summarizer()
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+# The sqlite file lives in the app's instance folder (created 0700) unless
+# CACHE_PATH points somewhere else, never in a shared directory like /tmp.
+CACHE_PATH = os.environ.get("CACHE_PATH") or os.path.join(app.instance_path, "cache.sqlite3")
+SEARCH_CACHE_MAX_BYTES = int(os.environ.get("SEARCH_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+SEARCH_CACHE_TTLS = {
+    "news": 120,
+    "stories": 120,
+    "text": 900,
+    "shopping": 900,
+    "image": 3600,
+    "video": 3600,
+}
+
+def encode_value(value):
+    # Cached values are JSON, not pickle, so a tampered cache file can only
+    # ever yield data. Tuples come back as lists; Document is the one class
+    # stored, tagged so it can be rebuilt.
+    return json.dumps(value, default=encode_object, separators=(",", ":")).encode("utf-8")
+
+def encode_object(value):
+    if isinstance(value, Document):
+        return {"__document__": value.to_dict()}
+    raise TypeError(f"cannot cache {type(value).__name__}")
+
+def decode_value(data):
+    return json.loads(data, object_hook=decode_object)
+
+def decode_object(obj):
+    if len(obj) == 1 and "__document__" in obj:
+        return Document.from_dict(obj["__document__"])
+    return obj
+
+class MemoryCache:
+    # Values are stored encoded so callers can mutate what they get back, so
+    # the byte cap reflects what is actually held, and so both backends
+    # return exactly the same types.
+    def __init__(self, name, max_bytes):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            data = entry[1]
+        return decode_value(data)
+
+    def set(self, key, value, ttl):
+        data = encode_value(value)
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.time() + ttl, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, data = self.entries.pop(key)
+        self.size -= len(data)
+
+    def stats(self):
+        with self.lock:
+            return {"backend": "memory", "entries": len(self.entries), "bytes": self.size,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}
+
+class SQLiteCache:
+    # Shared between gunicorn workers through one file on local disk. LRU is
+    # approximated with an accessed_at column; hit/miss counters are per worker.
+    def __init__(self, name, max_bytes, path=CACHE_PATH):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.name} (key TEXT PRIMARY KEY, value BLOB, "
+                         f"size INTEGER, expires_at REAL, accessed_at REAL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.name}_accessed ON {self.name} (accessed_at)")
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(f"SELECT value FROM {self.name} WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute(f"UPDATE {self.name} SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            app.logger.warning("Error reading %s cache: %s", self.name, e)
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            return decode_value(row[0])
+        except ValueError as e:
+            app.logger.warning("Error decoding %s cache entry: %s", self.name, e)
+            return None
+
+    def set(self, key, value, ttl):
+        data = encode_value(value)
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(f"INSERT OR REPLACE INTO {self.name} VALUES (?, ?, ?, ?, ?)",
+                         (key, data, len(data), now + ttl, now))
+            conn.execute(f"DELETE FROM {self.name} WHERE expires_at <= ?", (now,))
+            total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.name}").fetchone()[0]
+            while total > self.max_bytes:
+                oldest = conn.execute(f"SELECT key, size FROM {self.name} ORDER BY accessed_at LIMIT 1").fetchone()
+                conn.execute(f"DELETE FROM {self.name} WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+                self.evictions += 1
+        except sqlite3.Error as e:
+            app.logger.warning("Error writing %s cache: %s", self.name, e)
+
+    def stats(self):
+        try:
+            entries, size = self._conn().execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.name}").fetchone()
+        except sqlite3.Error:
+            entries, size = None, None
+        return {"backend": "sqlite", "entries": entries, "bytes": size, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+def make_cache(name, max_bytes, backend=CACHE_BACKEND):
+    if backend == "sqlite":
+        return SQLiteCache(name, max_bytes)
+    return MemoryCache(name, max_bytes)
+
+search_cache = make_cache("search_cache", SEARCH_CACHE_MAX_BYTES)
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution: the first
+    # caller runs fn and the rest wait on its Future for the same result or
+    # exception. Nothing is kept once the call returns; caching is separate.
+    def __init__(self, name):
+        self.name = name
+        self.calls = {}
+        self.leaders = 0
+        self.joined = 0
+        self.lock = threading.Lock()
+
+    def do(self, key, fn, *args):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.joined += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+
+    def running(self, key):
+        with self.lock:
+            return key in self.calls
+
+    def stats(self):
+        with self.lock:
+            return {"leaders": self.leaders, "joined": self.joined, "in_flight": len(self.calls)}
+
+search_flight = SingleFlight("search")
+
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", 16))
+FETCH_PER_HOST = int(os.environ.get("FETCH_PER_HOST", 4))
+PAGE_DEADLINE = float(os.environ.get("PAGE_DEADLINE", 8.0))
+
+class FetchScheduler:
+    # Runs per-result enrichment on a shared bounded pool. Each task holds a
+    # per-host slot while it runs so one slow site cannot take every worker.
+    def __init__(self, max_workers, per_host):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+        self.per_host = per_host
+        self.host_slots = {}
+        self.active = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def _slot(self, host):
+        # A host's entry lives only while some task holds or waits for one of
+        # its slots, so the table never outgrows the pool.
+        with self.lock:
+            slot = self.host_slots.get(host)
+            if slot is None:
+                slot = self.host_slots[host] = [threading.BoundedSemaphore(self.per_host), 0]
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self.lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self.host_slots[host]
+
+    def _call(self, url, fn, args):
+        with self.lock:
+            self.active += 1
+        try:
+            with self._slot(urlparse(url).netloc):
+                return fn(*args)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def submit(self, url, fn, *args):
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, self._call, url, fn, args)
+
+    def iter_completed(self, tasks, deadline):
+        # tasks is a list of (key, url, fn, *args); yields (key, result) in
+        # completion order and abandons whatever is still running at deadline.
+        # A task that hands the rest of its work to another pool returns that
+        # pool's Future, which is then waited on under the same key.
+        # Closing the generator early (a streamed page whose client went
+        # away) cancels the rest just the same.
+        futures = {self.submit(url, fn, *args): key for key, url, fn, *args in tasks}
+        pending = set(futures)
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        app.logger.warning("Error in enrichment task %s: %s", futures[future], e)
+                        continue
+                    if isinstance(result, Future):
+                        futures[result] = futures[future]
+                        pending.add(result)
+                    else:
+                        yield futures[future], result
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def run(self, tasks, deadline):
+        return dict(self.iter_completed(tasks, deadline))
+
+fetch_scheduler = FetchScheduler(FETCH_WORKERS, FETCH_PER_HOST)
+
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 5))
+HTTP_MAX_BYTES = int(os.environ.get("HTTP_MAX_BYTES", 2 * 1024 * 1024))
+HTTP_POOL_HOSTS = int(os.environ.get("HTTP_POOL_HOSTS", 100))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", FETCH_PER_HOST))
+
+try:
+    import brotli  # noqa: F401 -- urllib3 decodes "br" bodies when this is importable
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+http_stats = {"requests": 0, "connections_opened": 0, "truncated": 0, "bytes_read": 0}
+http_stats_lock = threading.Lock()
+
+def count_http(name, amount=1):
+    with http_stats_lock:
+        http_stats[name] += amount
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        count_http("connections_opened")
+        return super()._new_conn()
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        count_http("connections_opened")
+        return super()._new_conn()
+
+class PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+http_session = requests.Session()
+http_adapter = PooledAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE)
+http_session.mount("http://", http_adapter)
+http_session.mount("https://", http_adapter)
+http_session.headers.update({"User-Agent": "Mozilla/5.0", "Accept-Encoding": ACCEPT_ENCODING})
+
+HOST_SAMPLES = int(os.environ.get("HOST_SAMPLES", 50))
+HOST_MIN_SAMPLES = int(os.environ.get("HOST_MIN_SAMPLES", 5))
+HOST_TIMEOUT_FACTOR = float(os.environ.get("HOST_TIMEOUT_FACTOR", 3))
+HOST_MIN_TIMEOUT = float(os.environ.get("HOST_MIN_TIMEOUT", 1))
+HOST_BREAKER_FAILURES = int(os.environ.get("HOST_BREAKER_FAILURES", 3))
+HOST_BREAKER_COOLDOWN = float(os.environ.get("HOST_BREAKER_COOLDOWN", 60))
+HOST_BREAKER_MAX_COOLDOWN = float(os.environ.get("HOST_BREAKER_MAX_COOLDOWN", 900))
+HOST_TABLE_MAX = int(os.environ.get("HOST_TABLE_MAX", 2048))
+# Statuses that mean the host is refusing or failing us, as opposed to a
+# missing page.
+HOST_FAILURE_STATUSES = {403, 429}
+
+class HostUnavailable(requests.ConnectionError):
+    pass
+
+class HostHealth:
+    # Per-host latency and error tracking for scraped sites. Each host gets
+    # a read timeout of HOST_TIMEOUT_FACTOR x its observed p95 (capped by what
+    # the caller asked for), and a circuit breaker: after
+    # HOST_BREAKER_FAILURES failures in a row requests to it fail immediately
+    # with HostUnavailable for a cooldown. After the cooldown one trial
+    # request is let through; if it fails too the cooldown doubles.
+    def __init__(self, max_hosts):
+        self.max_hosts = max_hosts
+        self.hosts = OrderedDict()
+        self.lock = threading.Lock()
+        self.skipped = 0
+        self.trips = 0
+
+    def entry(self, host):
+        entry = self.hosts.get(host)
+        if entry is None:
+            entry = self.hosts[host] = {"latencies": deque(maxlen=HOST_SAMPLES), "requests": 0, "failures": 0,
+                                        "consecutive_failures": 0, "open_until": None, "trial": False,
+                                        "cooldown": HOST_BREAKER_COOLDOWN, "last_error": None}
+            while len(self.hosts) > self.max_hosts:
+                self.hosts.popitem(last=False)
+        else:
+            self.hosts.move_to_end(host)
+        return entry
+
+    def before_request(self, host, timeout):
+        # Returns the read timeout to use for host, or raises HostUnavailable
+        # while its circuit is open.
+        with self.lock:
+            entry = self.entry(host)
+            if entry["open_until"] is not None:
+                if entry["trial"] or time.time() < entry["open_until"]:
+                    self.skipped += 1
+                    raise HostUnavailable(f"circuit open for {host}")
+                entry["trial"] = True
+            return self.timeout(entry, timeout)
+
+    def timeout(self, entry, default):
+        if len(entry["latencies"]) < HOST_MIN_SAMPLES:
+            return default
+        return min(default, max(HOST_MIN_TIMEOUT, HOST_TIMEOUT_FACTOR * latency_percentile(entry["latencies"], 95)))
+
+    def record(self, host, seconds, ok, timed_out=False, error=None):
+        # Timeouts are kept as latency samples so a host that has become
+        # slower pulls its own timeout up instead of failing forever; fast
+        # refusals are not, or they would drag it down.
+        with self.lock:
+            entry = self.entry(host)
+            entry["requests"] += 1
+            if ok or timed_out:
+                entry["latencies"].append(seconds)
+            if ok:
+                entry["consecutive_failures"] = 0
+                entry["open_until"] = None
+                entry["trial"] = False
+                entry["cooldown"] = HOST_BREAKER_COOLDOWN
+                return
+            entry["failures"] += 1
+            entry["consecutive_failures"] += 1
+            entry["last_error"] = error
+            if entry["trial"]:
+                entry["cooldown"] = min(entry["cooldown"] * 2, HOST_BREAKER_MAX_COOLDOWN)
+            elif entry["open_until"] is not None or entry["consecutive_failures"] < HOST_BREAKER_FAILURES:
+                return
+            entry["trial"] = False
+            entry["open_until"] = time.time() + entry["cooldown"]
+            self.trips += 1
+            app.logger.info("Circuit opened for %s for %ds after %s", host, entry["cooldown"], error)
+
+    def table(self):
+        now = time.time()
+        with self.lock:
+            rows = {}
+            for host, entry in self.hosts.items():
+                latencies = entry["latencies"]
+                if entry["open_until"] is None:
+                    state = "closed"
+                else:
+                    state = "half_open" if entry["trial"] or now >= entry["open_until"] else "open"
+                rows[host] = {"state": state, "requests": entry["requests"], "failures": entry["failures"],
+                              "error_rate": entry["failures"] / entry["requests"] if entry["requests"] else 0.0,
+                              "consecutive_failures": entry["consecutive_failures"],
+                              "p50": latency_percentile(latencies, 50) if latencies else None,
+                              "p95": latency_percentile(latencies, 95) if latencies else None,
+                              "timeout": self.timeout(entry, HTTP_READ_TIMEOUT),
+                              "retry_in": max(entry["open_until"] - now, 0) if state == "open" else None,
+                              "last_error": entry["last_error"]}
+            return rows
+
+    def stats(self):
+        table = self.table()
+        with self.lock:
+            result = {"hosts": len(table), "skipped": self.skipped, "trips": self.trips}
+        for state in ("open", "half_open"):
+            result[state] = sum(1 for row in table.values() if row["state"] == state)
+        return result
+
+def latency_percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+host_health = HostHealth(HOST_TABLE_MAX)
+
+def tracked_request(method, url, timeout, **kwargs):
+    # Every request to a scraped site goes through its host's breaker and
+    # adaptive timeout, and its outcome feeds back into both.
+    host = urlparse(url).netloc
+    timeout = host_health.before_request(host, timeout)
+    count_http("requests")
+    started = time.monotonic()
+    try:
+        response = http_session.request(method, url, timeout=(min(HTTP_CONNECT_TIMEOUT, timeout), timeout), **kwargs)
+    except requests.Timeout as e:
+        host_health.record(host, time.monotonic() - started, False, timed_out=True, error=type(e).__name__)
+        raise
+    except Exception as e:
+        host_health.record(host, time.monotonic() - started, False, error=type(e).__name__)
+        raise
+    status = response.status_code
+    ok = status < 500 and status not in HOST_FAILURE_STATUSES
+    host_health.record(host, time.monotonic() - started, ok, error=None if ok else f"HTTP {status}")
+    return response
+
+def http_open(url, timeout=10):
+    # Connect and per-read stalls are bounded here; the caller bounds the
+    # whole exchange by passing a deadline to iter_body.
+    response = tracked_request("GET", url, min(HTTP_READ_TIMEOUT, timeout), stream=True)
+    response.truncated = False
+    return response
+
+def iter_body(response, deadline, max_bytes=HTTP_MAX_BYTES):
+    # Yields decoded body chunks. Reading stops at max_bytes (the response is
+    # marked truncated) and a Timeout is raised once the deadline passes.
+    size = 0
+    for chunk in response.iter_content(chunk_size=16384):
+        if size + len(chunk) >= max_bytes:
+            chunk = chunk[:max_bytes - size]
+            response.truncated = True
+            count_http("truncated")
+        size += len(chunk)
+        count_http("bytes_read", len(chunk))
+        yield chunk
+        if response.truncated:
+            return
+        if time.monotonic() > deadline:
+            raise requests.Timeout(f"Total timeout exceeded for {response.url}")
+
+def http_get(url, timeout=10, max_bytes=HTTP_MAX_BYTES):
+    # Bodies over max_bytes are cut off mid-stream and the decoded prefix is
+    # kept, which is enough for HTML extraction.
+    deadline = time.monotonic() + timeout
+    response = http_open(url, timeout)
+    try:
+        response._content = b"".join(iter_body(response, deadline, max_bytes))
+    except BaseException:
+        # A half-read body (e.g. the total timeout) must not go back to the pool.
+        response.close()
+        raise
+    if response.truncated:
+        response.close()
+    return response
+
+def http_head(url, timeout=5):
+    return tracked_request("HEAD", url, timeout)
+
+def http_pool_stats():
+    with http_stats_lock:
+        result = dict(http_stats)
+    result["connections_reused"] = max(result["requests"] - result["connections_opened"], 0)
+    return result
 
 def human_readable_time_ago(date_str):
     try:
@@ -49,6 +767,7 @@ def human_readable_time_ago(date_str):
     except:
         return "Unknown time"
 
+@timed("search")
 def search_duckduckgo(query, max_results=100, search_type="text", news_category=None):
     with DDGS() as ddgs:
         if search_type == "text":
@@ -78,84 +797,1105 @@ def search_duckduckgo(query, max_results=100, search_type="text", news_category=
         else:
             return []
 
-def fetch_page_content(url):
+SEARCH_PAGE_SIZE = 10
+SEARCH_PREFETCH = int(os.environ.get("SEARCH_PREFETCH", 10))
+SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", 100))
+
+def cached_search(query, max_results=SEARCH_PAGE_SIZE + SEARCH_PREFETCH, search_type="text", news_category=None,
+                  cache_only=False):
+    entry = search_entry(query, max_results, search_type, news_category, cache_only)
+    return None if entry is None else entry["results"][:max_results]
+
+def search_entry(query, max_results, search_type="text", news_category=None, cache_only=False):
+    # One cache entry per query holds {"results", "exhausted"} and grows as
+    # deeper pages are asked for, so page 1 only pays for page 1 plus
+    # SEARCH_PREFETCH hits. With cache_only, whatever is cached is returned
+    # as is, and None on a miss.
+    max_results = min(max_results, SEARCH_MAX_RESULTS)
+    key = repr((query, search_type, news_category or ""))
+    entry = search_cache.get(key)
+    if cache_only:
+        return entry
+    while entry is None or (len(entry["results"]) < max_results and not entry["exhausted"]):
+        # Callers annotate the hits in place, so everyone that shared the
+        # flight gets their own copy. A joined caller that needed more hits
+        # than the leader fetched goes round again as a leader.
+        entry = copy.deepcopy(search_flight.do(key, load_search, key, query, max_results, search_type, news_category))
+    return entry
+
+def result_key(r):
+    return r.get("href") or r.get("url") or r.get("image") or r.get("content") or r.get("title")
+
+def load_search(key, query, max_results, search_type, news_category):
+    entry = search_cache.get(key) or {"results": [], "exhausted": False}
+    if len(entry["results"]) >= max_results or entry["exhausted"]:
+        return entry
+    # DDGS 6.x returns lists and takes no offset, so extending means asking
+    # again for more and appending the hits not seen yet; earlier pages keep
+    # their order. Growing at least 2x keeps paging forward from refetching
+    # on every page.
+    wanted = min(max(max_results, 2 * len(entry["results"])), SEARCH_MAX_RESULTS)
+    fetched = search_duckduckgo(query, max_results=wanted, search_type=search_type, news_category=news_category)
+    seen = {result_key(r) for r in entry["results"]}
+    entry["results"] += [r for r in fetched if result_key(r) not in seen]
+    # Upstream repeats hits across its pages, so a list still short after
+    # dedupe counts as exhausted too; asking again would return the same.
+    entry["exhausted"] = len(fetched) < wanted or wanted >= SEARCH_MAX_RESULTS or len(entry["results"]) < max_results
+    search_cache.set(key, entry, SEARCH_CACHE_TTLS.get(search_type, 300))
+    return entry
+
+DOCUMENT_TTL = int(os.environ.get("DOCUMENT_TTL", 900))
+DOCUMENT_FAILURE_TTL = int(os.environ.get("DOCUMENT_FAILURE_TTL", 60))
+DOCUMENT_CACHE_MAX_BYTES = int(os.environ.get("DOCUMENT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+DOCUMENT_PARAGRAPHS = 10
+EXTRACTION_MODE = os.environ.get("EXTRACTION_MODE", "full")
+STREAM_PARAGRAPHS = int(os.environ.get("STREAM_PARAGRAPHS", 3))
+STREAM_MAX_BYTES = int(os.environ.get("STREAM_MAX_BYTES", 512 * 1024))
+STREAM_PARSE_BUDGET = float(os.environ.get("STREAM_PARSE_BUDGET", 0.05))
+PLACEHOLDER_IMAGE = "https://via.placeholder.com/600x400?text=No+Image"
+PRICE_PATTERNS = [
+    r'\$\d+\.?\d*', 
+    r'USD\s*\d+\.?\d*', 
+    r'₹\s*\d+,?\d*\.?\d*',
+]
+PRICE_RE = re.compile("|".join(PRICE_PATTERNS))
+PRICE_CLASSES = ['price', 'amount', 'cost', 'product-price', 'price-tag', 'deal']
+CURRENCY_SYMBOLS = {"USD": "$", "INR": "₹", "EUR": "€", "GBP": "£"}
+IMAGE_CLASSES = ['product-image', 'thumbnail', 'main-image', 'item-image', 'hero-image']
+IMAGE_ALT_KEYWORDS = ['article', 'news', 'featured']
+EXTRACTION_RULES_MAX_BYTES = int(os.environ.get("EXTRACTION_RULES_MAX_BYTES", 1024 * 1024))
+EXTRACTION_RULE_TTL = int(os.environ.get("EXTRACTION_RULE_TTL", 7 * 24 * 3600))
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+class Document:
+    # Everything the extractors need from one page, pulled out of a single
+    # parse. The soup itself is not kept, so cached documents stay small.
+    def __init__(self, url, html=None):
+        self.url = url
+        self.ok = html is not None
+        self.paragraphs = []
+        self.meta = {}
+        self.price = "Price not found"
+        self.image = PLACEHOLDER_IMAGE
+        if html is not None:
+            soup = BeautifulSoup(html, HTML_PARSER)
+            self.paragraphs = [p.get_text() for p in soup.find_all("p", limit=DOCUMENT_PARAGRAPHS)]
+            for tag in soup.find_all("meta"):
+                key = tag.get("property") or tag.get("name")
+                if key and tag.get("content"):
+                    self.meta.setdefault(key.lower(), tag["content"])
+            json_ld = [tag.string or "" for tag in soup.find_all("script", type="application/ld+json")]
+            self.price, self.image = extract_product(soup, url, self.meta, json_ld)
+
+    @classmethod
+    def from_extractor(cls, url, extractor):
+        doc = cls(url)
+        doc.ok = True
+        doc.paragraphs = extractor.paragraphs
+        doc.meta = extractor.meta
+        price, image = extractor.structured
+        learn_extraction_rule(url, extractor.rule, None if price or extractor.rule_price else extractor.price_node,
+                              None if image or extractor.rule_image else extractor.image_class)
+        doc.price = price or extractor.dom_price or "Price not found"
+        doc.image = image or extractor.dom_image or PLACEHOLDER_IMAGE
+        return doc
+
+    def to_dict(self):
+        return {"url": self.url, "ok": self.ok, "paragraphs": self.paragraphs, "meta": self.meta,
+                "price": self.price, "image": self.image}
+
+    @classmethod
+    def from_dict(cls, data):
+        doc = cls(data["url"])
+        doc.ok = data["ok"]
+        doc.paragraphs = data["paragraphs"]
+        doc.meta = data["meta"]
+        doc.price = data["price"]
+        doc.image = data["image"]
+        return doc
+
+class StreamingExtractor(HTMLParser):
+    # Incremental counterpart of Document: fed the body chunk by chunk, it
+    # reports done once it has the first paragraphs, an image and, on pages
+    # that declare themselves products, a price. With a learned rule for the
+    # domain, the price comes from the rule's node rather than the first
+    # price-looking one.
+    def __init__(self, url, paragraphs=STREAM_PARAGRAPHS, rule=None):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.wanted_paragraphs = paragraphs
+        self.rule = normalize_rule(rule)
+        self.paragraphs = []
+        self.meta = {}
+        self.json_ld = []
+        self.json_ld_parts = None
+        self.structured = (None, None)
+        self.price = None
+        self.price_node = None
+        self.rule_price = None
+        self.class_image = None
+        self.image_class = None
+        self.rule_image = None
+        self.alt_image = None
+        self.paragraph = None
+        self.price_tags = []
+        self.skipping = 0
+
+    @property
+    def wants_price(self):
+        return (self.meta.get("og:type") == "product" or any(key.startswith("product:") for key in self.meta)
+                or self.structured[0] is not None)
+
+    @property
+    def dom_price(self):
+        return self.rule_price or self.price
+
+    @property
+    def dom_image(self):
+        return self.rule_image or self.class_image or self.alt_image
+
+    @property
+    def done(self):
+        price_ready = (self.structured[0] is not None or "product:price:amount" in self.meta
+                       or self.rule_price is not None or (self.price is not None and not self.rule.get("price")))
+        image_ready = (self.structured[1] or "og:image" in self.meta or self.rule_image
+                       or ((self.class_image or self.alt_image) and not self.rule.get("image")))
+        return (len(self.paragraphs) >= self.wanted_paragraphs and bool(image_ready)
+                and (price_ready or not self.wants_price))
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in ("script", "style"):
+            self.skipping += 1
+            if tag == "script" and attrs.get("type") == "application/ld+json":
+                self.json_ld_parts = []
+            return
+        classes = (attrs.get("class") or "").split()
+        if tag == "p":
+            self._close_paragraph()
+            if len(self.paragraphs) < self.wanted_paragraphs:
+                self.paragraph = []
+        elif tag == "meta":
+            key = attrs.get("property") or attrs.get("name")
+            if key and attrs.get("content"):
+                self.meta.setdefault(key.lower(), attrs["content"])
+        elif tag == "img":
+            src = attrs.get("src")
+            image_class = next((c for c in classes if c in IMAGE_CLASSES), None)
+            if self.rule_image is None and src and self.rule.get("image") in classes:
+                self.rule_image = absolute_image_url(src, self.url)
+            if self.class_image is None and src and image_class:
+                self.class_image = absolute_image_url(src, self.url)
+                self.image_class = image_class
+            elif self.alt_image is None and any(k in (attrs.get("alt") or "").lower() for k in IMAGE_ALT_KEYWORDS):
+                self.alt_image = absolute_image_url(src or PLACEHOLDER_IMAGE, self.url)
+        if tag in ("span", "div", "p") and self.rule_price is None and (self.price is None or self.rule.get("price")):
+            price_class = next((c for c in classes if c in PRICE_CLASSES), None)
+            if price_class:
+                self.price_tags.append((tag, price_class, []))
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style"):
+            self.skipping = max(self.skipping - 1, 0)
+            if tag == "script" and self.json_ld_parts is not None:
+                self.json_ld.append("".join(self.json_ld_parts))
+                self.json_ld_parts = None
+                self.structured = structured_price_and_image(self.meta, self.json_ld, self.url)
+            return
+        if tag == "p":
+            self._close_paragraph()
+        if self.price_tags and self.price_tags[-1][0] == tag:
+            _, price_class, parts = self.price_tags.pop()
+            node = (tag, price_class)
+            if self.price is None or node == self.rule.get("price"):
+                price = match_price("".join(parts).strip())
+                if price and node == self.rule.get("price"):
+                    self.rule_price = price
+                elif price and self.price is None:
+                    self.price, self.price_node = price, node
+
+    def handle_data(self, data):
+        if self.skipping:
+            if self.json_ld_parts is not None:
+                self.json_ld_parts.append(data)
+            return
+        if self.paragraph is not None:
+            self.paragraph.append(data)
+        for _, _, parts in self.price_tags:
+            parts.append(data)
+
+    def close(self):
+        super().close()
+        # Meta-only structured data is picked up here for pages without any
+        # JSON-LD block.
+        self.structured = structured_price_and_image(self.meta, self.json_ld, self.url)
+
+    def _close_paragraph(self):
+        if self.paragraph is not None:
+            self.paragraphs.append("".join(self.paragraph))
+            self.paragraph = None
+
+document_cache = make_cache("document_cache", DOCUMENT_CACHE_MAX_BYTES)
+extraction_rules = make_cache("extraction_rules", EXTRACTION_RULES_MAX_BYTES)
+document_flight = SingleFlight("document")
+
+def stream_document(url, timeout=10):
+    # Feeds the body through StreamingExtractor and stops reading the socket
+    # as soon as it is done or the byte/parse-time budget runs out.
+    deadline = time.monotonic() + timeout
+    response = http_open(url, timeout)
+    try:
+        response.raise_for_status()
+        charset = response.encoding if "charset" in response.headers.get("Content-Type", "").lower() else "utf-8"
+        try:
+            decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        extractor = StreamingExtractor(url, rule=extraction_rules.get(urlparse(url).netloc))
+        parse_time = 0.0
+        for chunk in iter_body(response, deadline, STREAM_MAX_BYTES):
+            started = time.perf_counter()
+            extractor.feed(decoder.decode(chunk))
+            parse_time += time.perf_counter() - started
+            if extractor.done or parse_time > STREAM_PARSE_BUDGET:
+                break
+        extractor.close()
+    finally:
+        response.close()
+    record_stage("parse", parse_time)
+    return Document.from_extractor(url, extractor)
+
+@timed("document")
+def load_document(url):
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers, timeout=10)
+        if EXTRACTION_MODE == "stream":
+            return stream_document(url)
+        response = http_get(url, timeout=10)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        paragraphs = soup.find_all("p")
-        text = "\n".join([p.get_text() for p in paragraphs[:3]])
+        with stage_timer("parse"):
+            return Document(url, response.text)
+    except HostUnavailable as e:
+        # The snippet stands in for the page until the host's cooldown ends.
+        app.logger.info("Skipping %s: %s", url, e)
+        return Document(url)
+    except Exception as e:
+        app.logger.warning("Error fetching %s: %s", url, e)
+        return Document(url)
+
+def get_document(url):
+    doc = document_cache.get(url)
+    if doc is not None:
+        return doc
+    # Text and image extraction for the same story, and every request for a
+    # trending query, share one fetch per URL.
+    return document_flight.do(url, load_and_cache_document, url)
+
+def load_and_cache_document(url):
+    doc = document_cache.get(url)
+    if doc is None:
+        doc = load_document(url)
+        document_cache.set(url, doc, DOCUMENT_TTL if doc.ok else DOCUMENT_FAILURE_TTL)
+    return doc
+
+@timed("page_content")
+def fetch_page_content(url):
+    return "\n".join(get_document(url).paragraphs[:3])
+
+# "sqlite" shares summaries between workers through the CACHE_PATH file.
+SUMMARY_CACHE_BACKEND = os.environ.get("SUMMARY_CACHE_BACKEND", "memory")
+SUMMARY_CACHE_MAX_BYTES = int(os.environ.get("SUMMARY_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+SUMMARY_CACHE_TTL = int(os.environ.get("SUMMARY_CACHE_TTL", 30 * 24 * 3600))
+
+summary_cache = make_cache("summary_cache", SUMMARY_CACHE_MAX_BYTES, backend=SUMMARY_CACHE_BACKEND)
+summary_flight = SingleFlight("summary")
+
+def summary_cache_key(text):
+    # Whitespace differences between fetches of the same article should not
+    # miss; the model, backend and generation params are part of the key so
+    # changing any of them never serves a stale summary. The backend is the
+    # one that actually loaded (onnx falls back to fp32 without optimum);
+    # before the load it is the requested one, which only ever holds
+    # summaries that backend really produced.
+    normalized = " ".join(text.split())
+    backend = summarizer_state["backend"] or SUMMARIZER_BACKEND
+    payload = json.dumps([SUMMARIZER_MODEL, backend, SUMMARY_PARAMS, normalized], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+SUMMARY_BATCHING = os.environ.get("SUMMARY_BATCHING", "0") == "1"
+SUMMARY_BATCH_SIZE = int(os.environ.get("SUMMARY_BATCH_SIZE", 8))
+SUMMARY_BATCH_WAIT = float(os.environ.get("SUMMARY_BATCH_WAIT", 0.02))
+SUMMARY_TIMEOUT = float(os.environ.get("SUMMARY_TIMEOUT", 60))
+
+SUMMARY_MAX_INPUT_TOKENS = int(os.environ.get("SUMMARY_MAX_INPUT_TOKENS", 0))
+SUMMARY_MAX_CHUNKS = int(os.environ.get("SUMMARY_MAX_CHUNKS", 4))
+SUMMARY_LONG_DEADLINE = float(os.environ.get("SUMMARY_LONG_DEADLINE", 20))
+
+def input_token_limit():
+    # Tokens of input the encoder can actually see, less the BOS/EOS the
+    # pipeline adds. SUMMARY_MAX_INPUT_TOKENS can lower it further.
+    tokenizer = get_summarizer().tokenizer
+    limit = min(tokenizer.model_max_length, getattr(get_summarizer().model.config, "max_position_embeddings", tokenizer.model_max_length))
+    if SUMMARY_MAX_INPUT_TOKENS:
+        limit = min(limit, SUMMARY_MAX_INPUT_TOKENS)
+    return limit - tokenizer.num_special_tokens_to_add()
+
+def count_tokens(text):
+    return len(get_summarizer().tokenizer(text, add_special_tokens=False)["input_ids"])
+
+def truncate_for_model(text):
+    ids = get_summarizer().tokenizer(text, add_special_tokens=False)["input_ids"]
+    limit = input_token_limit()
+    if len(ids) <= limit:
         return text
+    return get_summarizer().tokenizer.decode(ids[:limit], skip_special_tokens=True, clean_up_tokenization_spaces=False)
+
+def chunk_text(text, limit):
+    # Packs whole sentences into chunks of at most limit tokens. A single
+    # sentence longer than that becomes its own chunk and is truncated later.
+    sentences = re.split(r"(?<=[.!?])\s+", text.strip())
+    counts = [len(ids) for ids in get_summarizer().tokenizer(sentences, add_special_tokens=False)["input_ids"]]
+    chunks = []
+    current = []
+    size = 0
+    for sentence, count in zip(sentences, counts):
+        if current and size + count > limit:
+            chunks.append(" ".join(current))
+            current = []
+            size = 0
+        current.append(sentence)
+        size += count
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+# Summaries are requested from request threads, job workers and
+# summary_executor, so without a limit every one of them could be running a
+# generation at once. Callers that cannot get a slot within SUMMARY_TIMEOUT,
+# or before their deadline, give up and fall back to the text.
+SUMMARY_MODEL_CONCURRENCY = int(os.environ.get("SUMMARY_MODEL_CONCURRENCY", 1))
+SUMMARY_POOL_WORKERS = int(os.environ.get("SUMMARY_POOL_WORKERS", 4))
+model_slots = threading.BoundedSemaphore(SUMMARY_MODEL_CONCURRENCY)
+
+# Per-result summaries wait on model_slots here rather than in fetch_scheduler,
+# so a queue of summaries never starves the fetch pool of workers.
+summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_POOL_WORKERS, thread_name_prefix="summary")
+
+def model_wait(deadline=None):
+    # Seconds a caller may wait for the model: SUMMARY_TIMEOUT, cut short by
+    # its deadline. Past the deadline it only takes a slot that is free now.
+    if deadline is None:
+        return SUMMARY_TIMEOUT
+    return min(SUMMARY_TIMEOUT, max(deadline - time.monotonic(), 0))
+
+@contextmanager
+def model_slot(deadline=None):
+    if not model_slots.acquire(timeout=model_wait(deadline)):
+        raise TimeoutError("timed out waiting for the summarizer")
+    try:
+        yield
+    finally:
+        model_slots.release()
+
+def run_summarizer(text, deadline=None):
+    with model_slot(deadline):
+        return get_summarizer()(truncate_for_model(text), **SUMMARY_PARAMS)[0]['summary_text']
+
+def run_summarizer_batch(texts):
+    # truncation keeps one over-long input from failing the whole batch.
+    texts = [truncate_for_model(text) for text in texts]
+    with model_slot():
+        outputs = get_summarizer()(texts, batch_size=len(texts), truncation=True, **SUMMARY_PARAMS)
+    return [(out[0] if isinstance(out, list) else out)['summary_text'] for out in outputs]
+
+class SummaryBatcher:
+    # Collects summarize jobs from every in-flight request for up to
+    # max_wait seconds (or max_batch jobs) and runs them through the model as
+    # one padded batch. The worker thread starts on first use so it is never
+    # created in a gunicorn master before fork.
+    def __init__(self, run_batch, max_batch, max_wait):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+
+    def submit(self, text):
+        future = Future()
+        self.queue.put((text, future))
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name="summary-batcher", daemon=True)
+                self.thread.start()
+        return future
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            try:
+                outputs = self.run_batch([text for text, _ in batch])
+                for (_, future), output in zip(batch, outputs):
+                    future.set_result(output)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            with self.lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.busy_seconds += time.monotonic() - started
+
+    def stats(self):
+        with self.lock:
+            return {"pending": self.queue.qsize(), "batches": self.batches, "items": self.items,
+                    "mean_batch_size": self.items / self.batches if self.batches else 0,
+                    "summaries_per_sec": self.items / self.busy_seconds if self.busy_seconds else 0}
+
+summary_batcher = SummaryBatcher(run_summarizer_batch, SUMMARY_BATCH_SIZE, SUMMARY_BATCH_WAIT)
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+def remote_summarize(text, mode="short"):
+    # Client side of the model server. Any failure or timeout falls back to
+    # the input text, exactly as a local generation error does.
+    timeout = SUMMARIZER_CLIENT_TIMEOUT + (SUMMARY_LONG_DEADLINE if mode == "long" else 0)
+    body = json.dumps({"text": text, "mode": mode})
+    headers = {"Content-Type": "application/json"}
+    try:
+        if SUMMARIZER_URL.startswith("unix://"):
+            conn = UnixHTTPConnection(SUMMARIZER_URL[len("unix://"):], timeout)
+            try:
+                conn.request("POST", "/summarize", body, headers)
+                response = conn.getresponse()
+                if response.status != 200:
+                    raise RuntimeError(f"model server returned {response.status}")
+                data = json.loads(response.read())
+            finally:
+                conn.close()
+        else:
+            response = http_session.post(SUMMARIZER_URL.rstrip("/") + "/summarize", data=body, headers=headers,
+                                         timeout=(HTTP_CONNECT_TIMEOUT, timeout))
+            response.raise_for_status()
+            data = response.json()
+        return data["summary"]
     except Exception as e:
-        print(f"Error fetching {url}: {e}")
-        return ""
+        app.logger.warning("Error calling summarizer at %s: %s", SUMMARIZER_URL, e)
+        return text
+
+# Summarizers are objects with a name and summarize(text). Which one runs
+# is SUMMARIZER_DEFAULT, overridden per search type by SUMMARIZER_BY_TYPE
+# (e.g. "stories=extractive,news=extractive"). When the abstractive model is
+# still loading, or its recent latency times the summaries queued ahead
+# exceeds SUMMARY_BUDGET seconds, the extractive one stands in
+# (SUMMARY_BUDGET=0 turns that off).
+SUMMARIZER_DEFAULT = os.environ.get("SUMMARIZER_DEFAULT", "abstractive").strip()
+SUMMARIZER_BY_TYPE = {search_type.strip(): name.strip() for search_type, name in
+                      (item.split("=", 1) for item in os.environ.get("SUMMARIZER_BY_TYPE", "").split(",") if "=" in item)}
+SUMMARY_BUDGET = float(os.environ.get("SUMMARY_BUDGET", 10))
+SUMMARY_SENTENCES = int(os.environ.get("SUMMARY_SENTENCES", 3))
+SUMMARY_STOPWORDS = frozenset(
+    "a about after all also an and are as at be been but by can could for from had has have he her his how i if in "
+    "into is it its more most not of on one or other our out over said she so than that the their them there these "
+    "they this to up was we were what when which who will with would you your".split())
+
+class AbstractiveSummarizer:
+    # distilbart, in process or through SUMMARIZER_URL, behind the summary
+    # cache and single-flight. latency is a moving average of actual model
+    # calls, cache hits excluded.
+    name = "abstractive"
+
+    def __init__(self):
+        self.latency = None
+        self.lock = threading.Lock()
+
+    def summarize(self, text, deadline=None):
+        # Identical texts being summarized at the same time share one model run.
+        key = summary_cache_key(text)
+        return summary_flight.do(key, compute_summary, key, text, deadline)
 
-def summarize_text(text):
+    def observe(self, seconds):
+        with self.lock:
+            self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+
+    def over_budget(self):
+        if not SUMMARIZER_URL and summarizer_state["status"] in ("loading", "failed"):
+            return True
+        with self.lock:
+            latency = self.latency
+        if latency is None:
+            return False
+        backlog = summary_batcher.queue.qsize() + summary_flight.stats()["in_flight"]
+        return latency * (1 + backlog) > SUMMARY_BUDGET
+
+class ExtractiveSummarizer:
+    # TextRank over TF-IDF sentence vectors: each sentence is scored by its
+    # centrality in the cosine-similarity graph, with a small bonus for
+    # coming early, and the best few that don't repeat each other are
+    # returned in document order. Milliseconds per article, no model.
+    name = "extractive"
+
+    def __init__(self, sentences=SUMMARY_SENTENCES, damping=0.85, lead_bonus=0.5, max_similarity=0.6):
+        self.sentences = sentences
+        self.damping = damping
+        self.lead_bonus = lead_bonus
+        self.max_similarity = max_similarity
+
+    def summarize(self, text, deadline=None):
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", text) if len(s.split()) >= 4]
+        if len(sentences) <= self.sentences:
+            return " ".join(sentences) or text
+        vocab = {}
+        rows, cols = [], []
+        for i, sentence in enumerate(sentences):
+            for word in re.findall(r"[a-z0-9]+", sentence.lower()):
+                if word not in SUMMARY_STOPWORDS:
+                    rows.append(i)
+                    cols.append(vocab.setdefault(word, len(vocab)))
+        if not vocab:
+            return " ".join(sentences[:self.sentences])
+        n = len(sentences)
+        tf = np.zeros((n, len(vocab)))
+        np.add.at(tf, (rows, cols), 1)
+        vectors = tf * (np.log((1 + n) / (1 + np.count_nonzero(tf, axis=0))) + 1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        similarity = vectors @ vectors.T
+        np.fill_diagonal(similarity, 0)
+        totals = similarity.sum(axis=1, keepdims=True)
+        transition = np.divide(similarity, totals, out=np.full_like(similarity, 1 / n), where=totals > 0)
+        scores = np.full(n, 1 / n)
+        for _ in range(100):
+            updated = (1 - self.damping) / n + self.damping * (transition.T @ scores)
+            converged = np.abs(updated - scores).sum() < 1e-6
+            scores = updated
+            if converged:
+                break
+        scores *= 1 + self.lead_bonus / (1 + np.arange(n))
+        chosen = []
+        for i in np.argsort(-scores):
+            if all(similarity[i, j] < self.max_similarity for j in chosen):
+                chosen.append(i)
+                if len(chosen) == self.sentences:
+                    break
+        return " ".join(sentences[i] for i in sorted(chosen))
+
+abstractive_summarizer = AbstractiveSummarizer()
+SUMMARIZERS = {summarizer.name: summarizer for summarizer in (abstractive_summarizer, ExtractiveSummarizer())}
+for search_type, name in [("default", SUMMARIZER_DEFAULT)] + list(SUMMARIZER_BY_TYPE.items()):
+    if name not in SUMMARIZERS:
+        app.logger.warning("Unknown summarizer %r for %s, using abstractive", name, search_type)
+summarizer_counts = {"abstractive": 0, "extractive": 0, "over_budget": 0}
+summarizer_counts_lock = threading.Lock()
+
+def choose_summarizer():
+    # The search type comes from the request's timing context, which the
+    # fetch threads and summary jobs carry too.
+    timing = current_timing.get()
+    name = SUMMARIZER_BY_TYPE.get(timing.search_type if timing else "none", SUMMARIZER_DEFAULT)
+    summarizer = SUMMARIZERS.get(name, abstractive_summarizer)
+    over_budget = summarizer is abstractive_summarizer and SUMMARY_BUDGET > 0 and summarizer.over_budget()
+    if over_budget:
+        summarizer = SUMMARIZERS["extractive"]
+    with summarizer_counts_lock:
+        summarizer_counts[summarizer.name] = summarizer_counts.get(summarizer.name, 0) + 1
+        summarizer_counts["over_budget"] += over_budget
+    return summarizer
+
+def summarizer_stats():
+    with summarizer_counts_lock:
+        result = dict(summarizer_counts)
+    result["abstractive_latency"] = abstractive_summarizer.latency
+    return result
+
+@timed("summarize")
+def summarize_text(text, summarizer=None, deadline=None):
     if len(text.split()) < 50:
         return text
+    return (summarizer or choose_summarizer()).summarize(text, deadline)
+
+def compute_summary(key, text, deadline=None):
+    started = time.monotonic()
+    if SUMMARIZER_URL:
+        summary = remote_summarize(text)
+        abstractive_summarizer.observe(time.monotonic() - started)
+        return summary
+    summary = summary_cache.get(key)
+    if summary is not None:
+        return summary
     try:
-        summary = summarizer(text, max_length=200, min_length=50, do_sample=False)
-        return summary[0]['summary_text']
+        if SUMMARY_BATCHING:
+            summary = summary_batcher.submit(text).result(timeout=model_wait(deadline))
+        else:
+            summary = run_summarizer(text, deadline)
+    except (TimeoutError, FutureTimeout) as e:
+        app.logger.warning("Error summarizing text: %s", e)
+        return text
     except Exception as e:
-        print(f"Error summarizing text: {e}")
+        app.logger.exception("Error summarizing text: %s", e)
         return text
+    abstractive_summarizer.observe(time.monotonic() - started)
+    # Keyed again now that the model is loaded, in case it fell back.
+    summary_cache.set(summary_cache_key(text), summary, SUMMARY_CACHE_TTL)
+    return summary
 
-def get_favicon_url(url):
+def summarize_chunks(chunks, deadline):
+    # With batching on, the chunks are submitted together so they share one
+    # batch; otherwise they run one after another. Either way chunks not
+    # done by the deadline are dropped.
+    if SUMMARY_BATCHING:
+        pool = ThreadPoolExecutor(max_workers=len(chunks))
+        futures = [pool.submit(summarize_text, chunk, abstractive_summarizer, deadline) for chunk in chunks]
+        pool.shutdown(wait=False)
+        done, _ = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+        return [future.result() for future in futures if future in done]
+    partials = []
+    for chunk in chunks:
+        if time.monotonic() > deadline:
+            break
+        partials.append(summarize_text(chunk, abstractive_summarizer, deadline))
+    return partials
+
+def summarize_long_text(text, summarizer=None, deadline=None):
+    # Map-reduce for input longer than the model's window: summarize up to
+    # SUMMARY_MAX_CHUNKS sentence-aligned chunks, then summarize the joined
+    # partial summaries if the SUMMARY_LONG_DEADLINE budget (or the caller's
+    # earlier deadline) allows. The extractive summarizer has no window and
+    # takes the text whole.
+    if len(text.split()) < 50:
+        return text
+    summarizer = summarizer or choose_summarizer()
+    if summarizer is not abstractive_summarizer:
+        return summarize_text(text, summarizer, deadline)
+    if SUMMARIZER_URL:
+        return remote_summarize(text, mode="long")
     try:
-        domain = urlparse(url).netloc
+        limit = input_token_limit()
+        if count_tokens(text) <= limit:
+            return summarize_text(text, summarizer, deadline)
+        chunks = chunk_text(text, limit)[:SUMMARY_MAX_CHUNKS]
+    except Exception as e:
+        app.logger.exception("Error chunking text: %s", e)
+        return summarize_text(text, summarizer, deadline)
+    long_deadline = time.monotonic() + SUMMARY_LONG_DEADLINE
+    deadline = long_deadline if deadline is None else min(deadline, long_deadline)
+    partials = summarize_chunks(chunks, deadline)
+    if not partials:
+        return text
+    combined = " ".join(partials)
+    if len(partials) > 1 and time.monotonic() < deadline:
+        return summarize_text(combined, summarizer, deadline)
+    return combined
+
+def summarize_contents(contents, deadline=None, summarizer=None):
+    all_text = ""
+    for content in contents:
+        if content:
+            all_text += content + "\n"
+    if all_text.strip():
+        return summarize_long_text(all_text, summarizer, deadline)
+    return "Unable to generate summary due to lack of fetchable content."
+
+def summarize_page(url, deadline=None, summarizer=None):
+    # Runs as a fetch_scheduler task: the page is fetched there, and the
+    # summary is handed to summary_executor, whose Future iter_completed
+    # waits on in place of this task.
+    content = fetch_page_content(url)
+    if not content:
+        return None
+    context = contextvars.copy_context()
+    return summary_executor.submit(context.run, summarize_text, content, summarizer, deadline)
+
+# Jobs live in the worker process that queued them, so with SUMMARY_ASYNC
+# the /summary/<id> polls must reach that same worker: run one worker, or
+# route by a sticky session. Polls that land elsewhere get a 404.
+SUMMARY_ASYNC = os.environ.get("SUMMARY_ASYNC", "0") == "1"
+SUMMARY_QUEUE_SIZE = int(os.environ.get("SUMMARY_QUEUE_SIZE", 64))
+SUMMARY_WORKERS = int(os.environ.get("SUMMARY_WORKERS", 2))
+SUMMARY_JOB_TTL = int(os.environ.get("SUMMARY_JOB_TTL", 300))
+
+class SummaryJob:
+    def __init__(self, job_id, payload):
+        self.id = job_id
+        self.payload = payload
+        self.status = "queued"
+        self.summary = None
+        self.error = None
+        self.created = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        data = {"job_id": self.id, "status": self.status}
+        if self.status in ("done", "failed"):
+            data["summary"] = self.summary
+        if self.error:
+            data["error"] = self.error
+        return data
+
+def run_summary_job(payload):
+    # {"text": ...} summarizes text as given. {"urls": [...]}, queued only by
+    # results(), fetches the pages first, like text mode does; "fallback" is
+    # returned when none of them had fetchable content (stories use the DDG
+    # snippet).
+    # Jobs run outside the request; its search type still picks the summarizer.
+    search_type = payload.get("type")
+    current_timing.set(RequestTiming(search_type if search_type in SEARCH_CACHE_TTLS else "none"))
+    if "text" in payload:
+        return summarize_long_text(payload["text"])
+    urls = payload.get("urls") or []
+    tasks = [(("content", i), url, fetch_page_content, url) for i, url in enumerate(urls) if url]
+    done = fetch_scheduler.run(tasks, time.monotonic() + PAGE_DEADLINE)
+    contents = [done.get(("content", i)) for i in range(len(urls))]
+    if not any(contents) and payload.get("fallback"):
+        return payload["fallback"]
+    return summarize_contents(contents)
+
+class SummaryJobQueue:
+    # Bounded queue of summary jobs run by a few worker threads, so request
+    # threads only enqueue and return. Identical payloads share one job id;
+    # finished jobs are kept for SUMMARY_JOB_TTL seconds for pollers.
+    def __init__(self, run_job, max_size, workers):
+        self.run_job = run_job
+        self.queue = queue.Queue(maxsize=max_size)
+        self.workers = workers
+        self.threads = []
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.counts = {"submitted": 0, "deduped": 0, "rejected": 0, "completed": 0, "failed": 0}
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def submit(self, payload):
+        # Returns the job, or None when the queue is full.
+        job_id = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+        with self.lock:
+            self._purge()
+            job = self.jobs.get(job_id)
+            if job is not None and job.status != "failed":
+                self.counts["deduped"] += 1
+                return job
+            job = SummaryJob(job_id, payload)
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                self.counts["rejected"] += 1
+                return None
+            self.jobs[job_id] = job
+            self.counts["submitted"] += 1
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._loop, name=f"summary-job-{len(self.threads)}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _purge(self):
+        now = time.monotonic()
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and now - job.finished > SUMMARY_JOB_TTL]:
+            del self.jobs[job_id]
+
+    def _loop(self):
+        while True:
+            job = self.queue.get()
+            job.started = time.monotonic()
+            job.status = "running"
+            try:
+                job.summary = self.run_job(job.payload)
+                job.status = "done"
+            except Exception as e:
+                app.logger.exception("Error running summary job %s: %s", job.id, e)
+                job.summary = job.payload.get("fallback")
+                job.error = str(e)
+                job.status = "failed"
+            job.finished = time.monotonic()
+            job.done.set()
+            waited = job.started - job.created
+            with self.lock:
+                self.counts["completed" if job.status == "done" else "failed"] += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+                self.run_seconds += job.finished - job.started
+
+    def stats(self):
+        with self.lock:
+            finished = self.counts["completed"] + self.counts["failed"]
+            return dict(self.counts, depth=self.queue.qsize(), capacity=self.queue.maxsize, workers=len(self.threads),
+                        mean_wait_seconds=self.wait_seconds / finished if finished else 0,
+                        max_wait_seconds=self.max_wait_seconds,
+                        mean_run_seconds=self.run_seconds / finished if finished else 0)
+
+summary_jobs = SummaryJobQueue(run_summary_job, SUMMARY_QUEUE_SIZE, SUMMARY_WORKERS)
+
+# "sqlite" shares favicon lookups between workers through the CACHE_PATH file.
+FAVICON_CACHE_BACKEND = os.environ.get("FAVICON_CACHE_BACKEND", "memory")
+FAVICON_CACHE_MAX_BYTES = int(os.environ.get("FAVICON_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+FAVICON_TTL = int(os.environ.get("FAVICON_TTL", 30 * 24 * 3600))
+FAVICON_MISSING_TTL = int(os.environ.get("FAVICON_MISSING_TTL", 24 * 3600))
+FAVICON_ERROR_TTL = int(os.environ.get("FAVICON_ERROR_TTL", 600))
+FAVICON_REFRESH_AFTER = int(os.environ.get("FAVICON_REFRESH_AFTER", 7 * 24 * 3600))
+FAVICON_BACKGROUND_REFRESH = os.environ.get("FAVICON_BACKGROUND_REFRESH", "1") == "1"
+FAVICON_TIMEOUT = float(os.environ.get("FAVICON_TIMEOUT", 5))
+
+def fallback_favicon_url(url):
+    return f"https://www.google.com/s2/favicons?domain={urlparse(url).netloc}"
+
+class FaviconService:
+    # Favicons are resolved per domain, not per result. Entries are
+    # (favicon_url or None, checked_at); None is a negative entry that maps to
+    # the fallback service so domains without /favicon.ico aren't re-probed.
+    def __init__(self, cache, scheduler):
+        self.cache = cache
+        self.scheduler = scheduler
+        self.flight = SingleFlight("favicon")
+        self.refreshing = set()
+        self.counts = {"probes": 0, "found": 0, "missing": 0, "errors": 0, "refreshes": 0}
+        self.lock = threading.Lock()
+
+    def lookup(self, domain):
+        # Cached answer or None when the domain has to be probed. Stale
+        # entries are still served and refreshed in the background.
+        entry = self.cache.get(domain)
+        if entry is None:
+            return None
+        favicon, checked_at = entry
+        if FAVICON_BACKGROUND_REFRESH and time.time() - checked_at > FAVICON_REFRESH_AFTER:
+            with self.lock:
+                refresh = domain not in self.refreshing and not self.flight.running(domain)
+                if refresh:
+                    self.refreshing.add(domain)
+                    self.counts["refreshes"] += 1
+            if refresh:
+                self.scheduler.submit(f"https://{domain}/", self.refresh, domain)
+        return favicon or fallback_favicon_url(f"https://{domain}/")
+
+    def resolve(self, domain):
+        # Concurrent callers for the same domain share one probe.
+        return self.flight.do(domain, self.probe, domain)
+
+    def refresh(self, domain):
+        try:
+            return self.resolve(domain)
+        finally:
+            with self.lock:
+                self.refreshing.discard(domain)
+
+    @timed("favicon")
+    def probe(self, domain):
+        self.count("probes")
         favicon_url = f"https://{domain}/favicon.ico"
-        response = requests.head(favicon_url, timeout=5)
+        try:
+            response = http_head(favicon_url, timeout=FAVICON_TIMEOUT)
+        except Exception as e:
+            app.logger.info("Error probing favicon for %s: %s", domain, e)
+            self.count("errors")
+            self.cache.set(domain, (None, time.time()), FAVICON_ERROR_TTL)
+            return fallback_favicon_url(favicon_url)
         if response.status_code == 200:
+            self.count("found")
+            self.cache.set(domain, (favicon_url, time.time()), FAVICON_TTL)
             return favicon_url
-        return f"https://www.google.com/s2/favicons?domain={domain}"
-    except Exception:
-        return "https://www.google.com/s2/favicons?domain=example.com"
+        self.count("missing")
+        self.cache.set(domain, (None, time.time()), FAVICON_MISSING_TTL)
+        return fallback_favicon_url(favicon_url)
+
+    def resolve_many(self, urls, deadline=None):
+        # Maps each url to a favicon with at most one probe per distinct
+        # domain, all run concurrently. Domains still unresolved at the
+        # deadline get the fallback for this call only.
+        domains = {url: get_website_name(url) for url in urls if url}
+        favicons = {domain: self.lookup(domain) for domain in set(domains.values()) if domain}
+        tasks = [(domain, f"https://{domain}/", self.resolve, domain) for domain, favicon in favicons.items() if favicon is None]
+        if tasks:
+            favicons.update(self.scheduler.run(tasks, deadline or time.monotonic() + FAVICON_TIMEOUT))
+        return {url: favicons.get(domain) or fallback_favicon_url(url) for url, domain in domains.items()}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        return dict(counts, flight=self.flight.stats(), cache=self.cache.stats())
+
+favicon_cache = make_cache("favicon_cache", FAVICON_CACHE_MAX_BYTES, backend=FAVICON_CACHE_BACKEND)
+favicon_service = FaviconService(favicon_cache, fetch_scheduler)
+
+def get_favicon_url(url):
+    return favicon_service.resolve_many([url])[url]
 
 def get_website_name(url):
     return urlparse(url).netloc
 
-def extract_price_and_image(url):
+def match_price(text):
+    match = PRICE_RE.search(text)
+    return match.group() if match else None
+
+def absolute_image_url(src, url):
+    # Resolved against the page like a browser would, so relative and
+    # protocol-relative (//cdn...) sources from og:image and JSON-LD work.
+    return urljoin(url, src)
+
+def format_price(amount, currency):
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        price = "Price not found"
-        price_patterns = [
-            r'\$\d+\.?\d*', 
-            r'USD\s*\d+\.?\d*', 
-            r'₹\s*\d+,?\d*\.?\d*',
-        ]
-        for tag in soup.find_all(['span', 'div', 'p'], class_=['price', 'amount', 'cost', 'product-price', 'price-tag', 'deal']):
-            text = tag.get_text().strip()
-            for pattern in price_patterns:
-                match = re.search(pattern, text)
-                if match:
-                    price = match.group()
-                    break
-            if price != "Price not found":
-                break
-        
-        image = "https://via.placeholder.com/600x400?text=No+Image"  # Larger default for primary story
-        for img in soup.find_all('img', class_=['product-image', 'thumbnail', 'main-image', 'item-image', 'hero-image']):
-            if img.get('src'):
-                image = img['src']
-                if not image.startswith('http'):
-                    image = urlparse(url).scheme + "://" + urlparse(url).netloc + image
-                break
-        if image == "https://via.placeholder.com/600x400?text=No+Image":
-            for img in soup.find_all('img'):
-                if 'article' in str(img.get('alt', '').lower()) or 'news' in str(img.get('alt', '').lower()) or 'featured' in str(img.get('alt', '').lower()):
-                    image = img.get('src', image)
-                    if not image.startswith('http'):
-                        image = urlparse(url).scheme + "://" + urlparse(url).netloc + image
-                    break
+        amount = f"{float(str(amount).replace(',', '')):.2f}"
+    except ValueError:
+        return None
+    currency = (currency or "USD").upper()
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    return f"{symbol}{amount}" if symbol else f"{currency} {amount}"
 
-        return price, image
-    except Exception as e:
-        print(f"Error processing {url}: {e}")
-        return "Price not found", "https://via.placeholder.com/600x400?text=No+Image"
+def json_ld_products(blocks):
+    # Every schema.org Product in the page's JSON-LD, including ones nested
+    # in lists or an @graph.
+    pending = []
+    for block in blocks:
+        try:
+            pending.append(json.loads(block))
+        except ValueError:
+            continue
+    while pending:
+        item = pending.pop(0)
+        if isinstance(item, list):
+            pending.extend(item)
+        elif isinstance(item, dict):
+            types = item.get("@type")
+            if "Product" in (types if isinstance(types, list) else [types]):
+                yield item
+            if "@graph" in item:
+                pending.append(item["@graph"])
+
+def json_ld_image(value):
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get("url") or value.get("contentUrl")
+    return value if isinstance(value, str) and value else None
+
+def structured_price_and_image(meta, json_ld, url):
+    # The fast path: what the page declares about itself in JSON-LD
+    # Product/Offer data and product:price / og:image meta tags. Either
+    # value is None when the page doesn't say.
+    price = image = None
+    for product in json_ld_products(json_ld):
+        offers = product.get("offers") or []
+        for offer in offers if isinstance(offers, list) else [offers]:
+            if price is None and isinstance(offer, dict):
+                amount = offer.get("price", offer.get("lowPrice"))
+                if amount is not None:
+                    price = format_price(amount, offer.get("priceCurrency"))
+        image = image or json_ld_image(product.get("image"))
+        if price and image:
+            break
+    if price is None and meta.get("product:price:amount"):
+        price = format_price(meta["product:price:amount"], meta.get("product:price:currency"))
+    image = image or meta.get("og:image")
+    return price, absolute_image_url(image, url) if image else None
+
+def find_price(soup, node=None):
+    # Returns (price, (tag, class)) of the node it came from. A node learned
+    # for the domain is tried first and found with a single early-exit find.
+    if node:
+        tag = soup.find(node[0], class_=node[1])
+        price = tag and match_price(tag.get_text().strip())
+        if price:
+            return price, tuple(node)
+    for tag in soup.find_all(['span', 'div', 'p'], class_=PRICE_CLASSES):
+        price = match_price(tag.get_text().strip())
+        if price:
+            return price, (tag.name, next(c for c in tag.get("class", []) if c in PRICE_CLASSES))
+    return None, None
+
+def find_image(soup, url, image_class=None):
+    # Returns (image, class). One pass over the images: a classed product
+    # image wins anywhere on the page, otherwise the first keyword alt.
+    if image_class:
+        img = soup.find('img', class_=image_class)
+        if img and img.get('src'):
+            return absolute_image_url(img['src'], url), image_class
+    alt_image = None
+    for img in soup.find_all('img'):
+        src = img.get('src')
+        classes = img.get('class') or []
+        matched = next((c for c in classes if c in IMAGE_CLASSES), None)
+        if matched and src:
+            return absolute_image_url(src, url), matched
+        if alt_image is None:
+            alt = img.get('alt') or ''
+            if any(keyword in alt.lower() for keyword in IMAGE_ALT_KEYWORDS):
+                alt_image = absolute_image_url(src or PLACEHOLDER_IMAGE, url)
+    return alt_image, None
+
+def normalize_rule(rule):
+    # The price node is a (tag, class) tuple, which comes back from the
+    # cache as a list.
+    rule = dict(rule or {})
+    if rule.get("price"):
+        rule["price"] = tuple(rule["price"])
+    return rule
+
+def learn_extraction_rule(url, rule, price_node, image_class):
+    # Remembers which DOM nodes held the price and image on this domain so
+    # the next page from it goes straight there.
+    rule = normalize_rule(rule)
+    learned = dict(rule)
+    if price_node:
+        learned["price"] = tuple(price_node)
+    if image_class:
+        learned["image"] = image_class
+    if learned != rule:
+        extraction_rules.set(urlparse(url).netloc, learned, EXTRACTION_RULE_TTL)
+
+def extract_product(soup, url, meta, json_ld):
+    price, image = structured_price_and_image(meta, json_ld, url)
+    if price is None or image is None:
+        rule = extraction_rules.get(urlparse(url).netloc) or {}
+        price_node = image_class = None
+        if price is None:
+            price, price_node = find_price(soup, rule.get("price"))
+        if image is None:
+            image, image_class = find_image(soup, url, rule.get("image"))
+        learn_extraction_rule(url, rule, price_node, image_class)
+    return price or "Price not found", image or PLACEHOLDER_IMAGE
+
+@timed("price_image")
+def extract_price_and_image(url):
+    doc = get_document(url)
+    return doc.price, doc.image
 
 @app.route("/", methods=["GET", "POST"])
 def index():
@@ -163,583 +1903,843 @@ def index():
         query = request.form.get("query")
         return redirect(url_for("results", query=query, type="text"))
     
-    return render_template_string('''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Starry Search</title>
-            <style>
-                body {
-                    margin: 0;
-                    padding: 0;
-                    height: 100vh;
-                    display: flex;
-                    justify-content: center;
-                    align-items: center;
-                    background: linear-gradient(to bottom, #0f0c29, #302b63, #24243e);
-                    color: white;
-                    font-family: 'Arial', sans-serif;
-                    overflow: hidden;
-                    position: relative;
-                }
-                .search-container {
-                    text-align: center;
-                    z-index: 10;
-                }
-                h1 {
-                    font-size: 2.5rem;
-                    margin-bottom: 2rem;
-                    text-shadow: 0 0 10px rgba(255,255,255,0.5);
-                }
-                form {
-                    display: flex;
-                    flex-direction: column;
-                    align-items: center;
-                }
-                input {
-                    padding: 15px 20px;
-                    width: 500px;
-                    border: none;
-                    border-radius: 30px;
-                    font-size: 1.2rem;
-                    outline: none;
-                    box-shadow: 0 0 20px rgba(0,0,0,0.2);
-                    margin-bottom: 20px;
-                }
-                button {
-                    padding: 12px 30px;
-                    background: #4e54c8;
-                    color: white;
-                    border: none;
-                    border-radius: 30px;
-                    font-size: 1.1rem;
-                    cursor: pointer;
-                    transition: all 0.3s ease;
-                    box-shadow: 0 0 15px rgba(78, 84, 200, 0.5);
-                }
-                button:hover {
-                    background: #6a6fd1;
-                    transform: scale(1.05);
-                }
-                .star {
-                    position: absolute;
-                    background-color: white;
-                    border-radius: 50%;
-                    animation: twinkle var(--duration) infinite ease-in-out;
-                    opacity: 0;
-                }
-                @keyframes twinkle {
-                    0%, 100% { opacity: 0; }
-                    50% { opacity: var(--opacity); }
-                }
-            </style>
-        </head>
-        <body>
-            <div class="search-container">
-                <h1>✨ Starry Search ✨</h1>
-                <form method="POST">
-                    <input name="query" placeholder="Search the universe..." required>
-                    <button type="submit">Explore</button>
-                </form>
-            </div>
-            <script>
-                function createStars() {
-                    const count = 150;
-                    const container = document.body;
-                    for (let i = 0; i < count; i++) {
-                        const star = document.createElement('div');
-                        star.classList.add('star');
-                        const size = Math.random() * 3;
-                        const posX = Math.random() * window.innerWidth;
-                        const posY = Math.random() * window.innerHeight;
-                        const opacity = Math.random();
-                        const duration = 2 + Math.random() * 3;
-                        const delay = Math.random() * 5;
-                        star.style.width = `${size}px`;
-                        star.style.height = `${size}px`;
-                        star.style.left = `${posX}px`;
-                        star.style.top = `${posY}px`;
-                        star.style.setProperty('--opacity', opacity);
-                        star.style.setProperty('--duration', `${duration}s`);
-                        star.style.animationDelay = `${delay}s`;
-                        container.appendChild(star);
-                    }
-                }
-                window.addEventListener('load', createStars);
-            </script>
-        </body>
-        </html>
-    ''')
+    return render_template("index.html")
+
+PREFETCH = os.environ.get("PREFETCH", "0") == "1"
+PREFETCH_QUEUE_SIZE = int(os.environ.get("PREFETCH_QUEUE_SIZE", 16))
+PREFETCH_DEADLINE = float(os.environ.get("PREFETCH_DEADLINE", 10))
+PREFETCH_TTL = int(os.environ.get("PREFETCH_TTL", 300))
+PREFETCH_MAX_ACTIVE_FETCHES = int(os.environ.get("PREFETCH_MAX_ACTIVE_FETCHES", FETCH_WORKERS // 2))
+# Below the CPU pressure at which admission control starts to degrade.
+PREFETCH_MAX_CPU = float(os.environ.get("PREFETCH_MAX_CPU", 0.5))
+PREFETCH_SUMMARIES = os.environ.get("PREFETCH_SUMMARIES", "1") == "1"
+
+class Prefetcher:
+    # Speculative warming of what a user is likely to open next from a
+    # results page. One low-priority thread works through a small bounded
+    # queue; every step first checks that the fetch pool and the CPU have
+    # headroom and that admission control is not degrading searches, and
+    # drops the rest of the plan when any of that fails.
+    def __init__(self, max_size):
+        self.queue = queue.Queue(maxsize=max_size)
+        self.thread = None
+        self.recent = {}
+        self.lock = threading.Lock()
+        self.counts = {"scheduled": 0, "duplicate": 0, "dropped": 0, "steps": 0, "cancelled": 0, "failed": 0}
+
+    def schedule(self, query, search_type, news_category, page):
+        if not query:
+            return
+        key = (query, search_type, news_category or "", page)
+        now = time.time()
+        with self.lock:
+            self.recent = {k: t for k, t in self.recent.items() if t > now - PREFETCH_TTL}
+            if key in self.recent:
+                self.counts["duplicate"] += 1
+                return
+            try:
+                self.queue.put_nowait((key, now))
+            except queue.Full:
+                self.counts["dropped"] += 1
+                return
+            self.recent[key] = now
+            self.counts["scheduled"] += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name="prefetch", daemon=True)
+                self.thread.start()
+
+    def overloaded(self):
+        cpu = cpu_pressure()
+        return (fetch_scheduler.active > PREFETCH_MAX_ACTIVE_FETCHES or (cpu is not None and cpu > PREFETCH_MAX_CPU)
+                or admission.tier > TIER_FULL)
+
+    def _loop(self):
+        current_timing.set(RequestTiming("prefetch"))
+        while True:
+            (query, search_type, news_category, page), queued_at = self.queue.get()
+            if time.time() - queued_at > PREFETCH_TTL:
+                self.count("cancelled")
+                continue
+            deadline = time.monotonic() + PREFETCH_DEADLINE
+            for step, args in self.plan(query, search_type, news_category, page):
+                if self.overloaded() or time.monotonic() > deadline:
+                    self.count("cancelled")
+                    break
+                try:
+                    step(*args, deadline)
+                    self.count("steps")
+                except Exception as e:
+                    app.logger.warning("Error prefetching %s for %r: %s", step.__name__, query, e)
+                    self.count("failed")
+
+    def plan(self, query, search_type, news_category, page):
+        # Cheapest and most likely first: the next page, then the tabs
+        # linked from page 1, then summaries, which cost model time.
+        steps = []
+        if search_type != "stories":
+            steps.append((prefetch_page, (query, search_type, news_category, page + 1)))
+        if page == 1 and search_type == "text":
+            steps.append((prefetch_page, (query, "news", None, 1)))
+            steps.append((prefetch_stories, (query,)))
+        return steps
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, depth=self.queue.qsize(), cpu=cpu_pressure(),
+                        active_fetches=fetch_scheduler.active)
+
+def prefetch_page(query, search_type, news_category, page, deadline):
+    # Search hits, favicons and, for shopping, the product documents for the
+    # page, i.e. everything results() would otherwise wait on.
+    hits = cached_search(query, max_results=page * SEARCH_PAGE_SIZE + SEARCH_PREFETCH,
+                         search_type=search_type, news_category=news_category)
+    hits = hits[(page - 1) * SEARCH_PAGE_SIZE:page * SEARCH_PAGE_SIZE]
+    urls = [url for url in (r.get("href") or r.get("url") for r in hits) if url]
+    favicon_service.resolve_many(urls, deadline)
+    if search_type == "shopping":
+        fetch_scheduler.run([(url, url, get_document, url) for url in urls], deadline)
+
+def prefetch_stories(query, deadline):
+    stories = cached_search(query, max_results=5, search_type="stories")[:5]
+    urls = [story["url"] for story in stories if story.get("url")]
+    favicon_service.resolve_many(urls, deadline)
+    # Summaries only once the model is loaded and nobody is queued for it;
+    # otherwise just warm the documents they would need.
+    summaries = PREFETCH_SUMMARIES and summarizer_state["status"] in ("ready", "remote") and summary_jobs.queue.qsize() == 0
+    if summaries:
+        tasks = [(url, url, run_as, "stories", summarize_page, url, deadline) for url in urls]
+    else:
+        tasks = [(url, url, run_as, "stories", get_document, url) for url in urls]
+    fetch_scheduler.run(tasks, deadline)
+
+prefetcher = Prefetcher(PREFETCH_QUEUE_SIZE)
+
+ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "1") == "1"
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", 48))
+ADMISSION_MAX_SUMMARY_QUEUE = int(os.environ.get("ADMISSION_MAX_SUMMARY_QUEUE", 32))
+ADMISSION_MAX_CPU = float(os.environ.get("ADMISSION_MAX_CPU", 1.0))
+ADMISSION_HOLD = float(os.environ.get("ADMISSION_HOLD", 10))
+TIER_FULL, TIER_NO_SCRAPES, TIER_SNIPPETS, TIER_CACHED_ONLY = range(4)
+TIER_NAMES = ["full", "no_shopping_scrapes", "snippets", "cached_only"]
+# (pressure, tier): pressure is a signal as a fraction of its limit, and
+# each tier starts once the worst signal reaches its threshold.
+DEGRADATION_TIERS = [(1.0, TIER_CACHED_ONLY), (0.8, TIER_SNIPPETS), (0.6, TIER_NO_SCRAPES)]
+# CPU on its own never goes past snippets: cached_only fetches nothing, so
+# a busy CPU with empty caches would otherwise turn every search into a 503.
+CPU_MAX_TIER = TIER_SNIPPETS
+CGROUP_CPU_PRESSURE = "/sys/fs/cgroup/cpu.pressure"
+
+def cpu_pressure():
+    # PSI "some avg10" for this cgroup: the share of the last 10s in which
+    # runnable tasks here waited for a CPU. Unlike the host-wide load average
+    # it ignores other tenants and CPUs we cannot use. None where PSI is
+    # unavailable: this process's own CPU time is no substitute, since a
+    # single generation keeps every core busy without anything waiting.
+    try:
+        with open(CGROUP_CPU_PRESSURE) as f:
+            for line in f:
+                if line.startswith("some "):
+                    return float(line.split()[1].split("=")[1]) / 100
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def tier_for(pressure):
+    return next((tier for threshold, tier in DEGRADATION_TIERS if pressure >= threshold), TIER_FULL)
+
+class AdmissionController:
+    # Picks a degradation tier for each search request from the requests
+    # in flight, the summarizer backlog and, where PSI is available, CPU
+    # pressure:
+    #   no_shopping_scrapes  shopping results keep their placeholder price
+    #   snippets             DDG snippets stand in for page summaries
+    #   cached_only          cached searches only, 503 on a miss
+    # The tier rises as soon as pressure crosses a threshold but only steps
+    # back down one tier per ADMISSION_HOLD seconds, so it does not flap.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.tier = TIER_FULL
+        self.changed = time.monotonic()
+        self.signals = {"in_flight": 0, "summary_queue": 0, "cpu": None}
+        self.counts = [0] * len(TIER_NAMES)
+        self.rejected = 0
+
+    def admit(self):
+        # Counts a request in and returns its tier; release() counts it out.
+        summary_queue = summary_jobs.queue.qsize() + summary_batcher.queue.qsize() + summary_flight.stats()["in_flight"]
+        cpu = cpu_pressure()
+        with self.lock:
+            self.in_flight += 1
+            self.signals = {"in_flight": self.in_flight, "summary_queue": summary_queue,
+                            "cpu": None if cpu is None else round(cpu, 2)}
+            target = tier_for(max(self.in_flight / ADMISSION_MAX_IN_FLIGHT, summary_queue / ADMISSION_MAX_SUMMARY_QUEUE))
+            if cpu is not None:
+                target = max(target, min(tier_for(cpu / ADMISSION_MAX_CPU), CPU_MAX_TIER))
+            now = time.monotonic()
+            if target > self.tier:
+                self.tier, self.changed = target, now
+            elif target < self.tier:
+                steps = int((now - self.changed) // ADMISSION_HOLD)
+                if steps:
+                    self.tier, self.changed = max(target, self.tier - steps), now
+            self.counts[self.tier] += 1
+            return self.tier
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def reject(self):
+        with self.lock:
+            self.rejected += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.signals, tier=self.tier, tier_name=TIER_NAMES[self.tier], in_flight=self.in_flight,
+                        requests=dict(zip(TIER_NAMES, self.counts)), rejected=self.rejected)
+
+admission = AdmissionController()
+
+class NotCached(Exception):
+    pass
+
+def busy_response():
+    admission.reject()
+    return Response("Starry is busy and this search is not cached yet. Please retry in a few seconds.\n", 503,
+                    {"Retry-After": str(int(ADMISSION_HOLD))}, mimetype="text/plain")
+
+def snippet_summary(results):
+    # The degraded stand-in for the AI summary: the snippets of the hits it
+    # would have summarized.
+    snippets = [r.get("body") for r in results[:2] if r.get("body")]
+    return " ".join(snippets) or "Summary unavailable right now, please retry shortly."
+
+NEWS_CATEGORIES = [
+    ("general", "🗞️ General News"),
+    ("political", "⚖️ Political News"),
+    ("business", "💹 Business & Finance News"),
+    ("technology", "🤖 Technology News"),
+    ("education", "🎓 Education News"),
+    ("entertainment", "🎭 Entertainment News"),
+    ("sports", "🏆 Sports News"),
+    ("weather", "🌦️ Weather News"),
+    ("science", "🌐 Science News"),
+    ("health", "🧘 Health News")
+]
+
+STREAM_RESULTS = os.environ.get("STREAM_RESULTS", "0") == "1"
+
+def shorten(text, limit):
+    return text[:limit] + "..." if len(text) > limit else text
+
+def apply_enrichment(key, value, page_results, top_stories):
+    # Stores one finished enrichment task on its result and returns the DOM
+    # patch a streamed page needs to show it.
+    kind, i = key
+    if kind == "favicon":
+        # Favicons are resolved once per domain; i is the domain here and the
+        # answer is fanned out to every story and result hosted on it.
+        patch = {}
+        for j, story in enumerate(top_stories):
+            if story.get("website") == i:
+                story["favicon"] = value
+                patch[f"story-favicon-{j}"] = {"src": value}
+        for j, result in enumerate(page_results):
+            if "favicon" in result and get_website_name(result.get("href") or result.get("url") or "") == i:
+                result["favicon"] = value
+                patch[f"favicon-{j}"] = {"src": value}
+        return patch
+    if kind == "story_summary" and value:
+        top_stories[i]["summary"] = value
+        return {f"story-summary-{i}": {"text": value if i == 0 else shorten(value, 100)}}
+    if kind == "story_image":
+        top_stories[i]["thumbnail"] = value[1]
+        return {f"story-thumb-{i}": {"src": value[1]}}
+    if kind == "shopping":
+        page_results[i]["price"], page_results[i]["thumbnail"] = value
+        return {f"price-{i}": {"text": value[0]}, f"thumb-{i}": {"src": value[1]}}
+    return {}
+
+def fill_script(patch):
+    # Escapes <, >, & and ' the way |tojson does, so scraped text such as
+    # "<!--<script>" cannot change how the browser parses the script.
+    return f"<script>starryFill({htmlsafe_json_dumps(patch)})</script>\n"
+
+def stream_results(shell, tasks, deadline, search_type, summary_sources, page_results, top_stories):
+    # The shell already holds the raw search hits with fallback favicons,
+    # thumbnails and snippets; each enrichment is patched in as it lands and
+    # the AI summary last.
+    yield shell
+    contents = {}
+    completed = fetch_scheduler.iter_completed(tasks, deadline)
+    try:
+        for key, value in completed:
+            if key[0] == "content":
+                contents[key[1]] = value
+                continue
+            patch = apply_enrichment(key, value, page_results, top_stories)
+            if patch:
+                yield fill_script(patch)
+    finally:
+        # Runs on client disconnect too, when the page's tasks are dropped.
+        completed.close()
+    if summary_sources:
+        summary = summarize_contents((contents.get(i) for i in range(summary_sources)), deadline)
+        yield fill_script({"ai-summary": {"text": summary}})
+    yield "\n</body>\n</html>\n"
 
 @app.route("/results")
 def results():
     query = request.args.get("query")
     search_type = request.args.get("type", "text")
     news_category = request.args.get("news_category", None)
-    page = request.args.get("page", 1, type=int)
-    per_page = 10
-    results = search_duckduckgo(query, max_results=100, search_type=search_type, news_category=news_category)
-    
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = SEARCH_PAGE_SIZE
+    tier = g.get("degradation_tier", TIER_FULL)
+    cache_only = tier >= TIER_CACHED_ONLY
+    # Stories mode renders only the top stories, never the paged hits.
+    if search_type == "stories":
+        results = []
+    else:
+        results = cached_search(query, max_results=page * per_page + SEARCH_PREFETCH,
+                                search_type=search_type, news_category=news_category, cache_only=cache_only)
+        if results is None:
+            return busy_response()
+
+    # total_pages only counts pages already fetched; while upstream has more,
+    # the prefetch window makes the next page show up as a link.
     total_results = len(results)
     total_pages = (total_results + per_page - 1) // per_page
     start_idx = (page - 1) * per_page
     end_idx = min(start_idx + per_page, total_results)
     page_results = results[start_idx:end_idx]
 
+    deadline = time.monotonic() + PAGE_DEADLINE
+    tasks = []
     top_stories = []
+    cold_domains = set()
     if search_type == "stories":
-        top_stories = search_duckduckgo(query, max_results=5, search_type="stories")[:5]
-        for story in top_stories:
+        top_stories = cached_search(query, max_results=5, search_type="stories", cache_only=cache_only)
+        if top_stories is None:
+            return busy_response()
+        top_stories = top_stories[:5]
+        for i, story in enumerate(top_stories):
             url = story.get("url")
             if url:
-                story["favicon"] = get_favicon_url(url)
                 story["website"] = get_website_name(url)
-                story["thumbnail"] = story.get("image", "https://via.placeholder.com/600x400?text=No+Image")
-                content = fetch_page_content(url)
-                story["summary"] = summarize_text(content) if content else story.get("body", "No description available.")
+                story["favicon"] = favicon_service.lookup(story["website"])
+                if story["favicon"] is None:
+                    story["favicon"] = fallback_favicon_url(url)
+                    cold_domains.add(story["website"])
+                story["thumbnail"] = story.get("image", PLACEHOLDER_IMAGE)
+                story["summary"] = story.get("body", "No description available.")
+                if tier >= TIER_SNIPPETS:
+                    continue
+                if SUMMARY_ASYNC:
+                    job = summary_jobs.submit({"urls": [url], "fallback": story["summary"], "type": search_type})
+                    if job is not None:
+                        story["summary_job"] = job.id
+                else:
+                    tasks.append((("story_summary", i), url, summarize_page, url, deadline))
                 if "via.placeholder.com" in story["thumbnail"]:
-                    _, new_image = extract_price_and_image(url)
-                    story["thumbnail"] = new_image
+                    tasks.append((("story_image", i), url, extract_price_and_image, url))
+
+    # Stories mode never renders page_results, so only enrich them for the other types.
+    if search_type != "stories":
+        for i, result in enumerate(page_results):
+            url = result.get("href") or result.get("url")
+            if url:
+                domain = get_website_name(url)
+                result["favicon"] = favicon_service.lookup(domain)
+                if result["favicon"] is None:
+                    result["favicon"] = fallback_favicon_url(url)
+                    cold_domains.add(domain)
+            if search_type == "news":
+                result["thumbnail"] = result.get("image", "https://via.placeholder.com/100x100?text=No+Image")
+            if search_type == "shopping":
+                result["price"] = "Price not found"
+                result["thumbnail"] = PLACEHOLDER_IMAGE
+                if url and tier < TIER_NO_SCRAPES:
+                    tasks.append((("shopping", i), url, extract_price_and_image, url))
+
+    if not cache_only:
+        for domain in cold_domains:
+            tasks.append((("favicon", domain), f"https://{domain}/", favicon_service.resolve, domain))
+
+    summary_urls = []
+    summary_job = None
+    # From the snippets tier down the summary is built from the hits alone.
+    ai_summary = search_type == "text" and tier < TIER_SNIPPETS
+    if ai_summary and SUMMARY_ASYNC:
+        job = summary_jobs.submit({"urls": [r.get("href") or r.get("url") for r in results[:2]], "type": search_type})
+        summary_job = job.id if job is not None else None
+    elif ai_summary:
+        summary_urls = [r.get("href") or r.get("url") for r in results[:2]]
+        for i, url in enumerate(summary_urls):
+            if url:
+                tasks.append((("content", i), url, fetch_page_content, url))
+
+    context = dict(query=query, search_type=search_type, news_category=news_category, page_results=page_results,
+                   page=page, total_pages=total_pages, start_idx=start_idx, summary=None, summary_job=summary_job,
+                   top_stories=top_stories)
+
+    if search_type == "text" and not ai_summary:
+        context["summary"] = snippet_summary(results)
+    elif ai_summary and SUMMARY_ASYNC:
+        context["summary"] = "Generating summary..." if summary_job else "Summary unavailable right now, please retry shortly."
+
+    if STREAM_RESULTS or request.args.get("stream") == "1":
+        if summary_urls:
+            context["summary"] = "Generating summary..."
+        with stage_timer("render"):
+            shell = render_template("results.html", streaming=True, **context)
+        response = Response(stream_results(shell, tasks, deadline, search_type, len(summary_urls), page_results, top_stories),
+                            mimetype="text/html", headers={"X-Accel-Buffering": "no"})
+        return with_prefetch(response, query, search_type, news_category, page)
+
+    done = fetch_scheduler.run(tasks, deadline)
+    for key, value in done.items():
+        apply_enrichment(key, value, page_results, top_stories)
+
+    if summary_urls:
+        context["summary"] = summarize_contents((done.get(("content", i)) for i in range(len(summary_urls))), deadline)
+
+    with stage_timer("render"):
+        response = Response(render_template("results.html", streaming=False, **context), mimetype="text/html")
+    return with_prefetch(response, query, search_type, news_category, page)
+
+def with_prefetch(response, query, search_type, news_category, page):
+    # Queued only once the response has been sent, so speculative work never
+    # competes with the page it is speculating from, and never while degraded.
+    if PREFETCH and g.get("degradation_tier", TIER_FULL) == TIER_FULL:
+        response.call_on_close(lambda: prefetcher.schedule(query, search_type, news_category, page))
+    return response
 
-    for result in page_results:
-        url = result.get("href") or result.get("url")
+# Templates are compiled once here rather than on the first request, and the
+# helpers every render needs are registered as globals instead of being
+# passed in each time.
+app.jinja_env.globals.update(human_readable_time_ago=human_readable_time_ago, news_categories=NEWS_CATEGORIES)
+for template_name in ("index.html", "results.html"):
+    app.jinja_env.get_template(template_name)
+
+@app.route("/summary", methods=["POST"])
+def summary_submit():
+    # Only text is accepted here. URL jobs are queued by results() for hits
+    # it got from the search; fetching URLs a client names would make this a
+    # proxy into whatever the server can reach, echoing short pages back.
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("text"), str):
+        return jsonify({"error": "expected a JSON body with 'text'"}), 400
+    payload = {"text": payload["text"]}
+    job = summary_jobs.submit(payload)
+    if job is None:
+        return jsonify({"error": "summary queue is full"}), 503, {"Retry-After": "5"}
+    data = job.to_dict()
+    data["status_url"] = url_for("summary_status", job_id=job.id)
+    data["events_url"] = url_for("summary_events", job_id=job.id)
+    return jsonify(data), 202
+
+@app.route("/summary/<job_id>")
+def summary_status(job_id):
+    job = summary_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/summary/<job_id>/events")
+def summary_events(job_id):
+    job = summary_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+
+    def events():
+        # One comment line every 15s keeps proxies from closing the stream.
+        while not job.done.wait(timeout=15):
+            yield ": waiting\n\n"
+        yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+API_FIELDS = ("title", "url", "snippet", "date", "source", "image", "favicon", "price", "product_image", "summary", "ai_summary")
+API_DEFAULT_FIELDS = ("title", "url", "snippet", "date", "source", "image")
+API_BATCH_MAX = int(os.environ.get("API_BATCH_MAX", 20))
+API_BATCH_WORKERS = int(os.environ.get("API_BATCH_WORKERS", 8))
+API_BATCH_MAX_TIMEOUT = float(os.environ.get("API_BATCH_MAX_TIMEOUT", 30))
+
+# Batch searches get their own pool: each one waits on enrichment tasks in
+# fetch_scheduler, which would deadlock if they ran inside it.
+api_executor = ThreadPoolExecutor(max_workers=API_BATCH_WORKERS, thread_name_prefix="api")
+
+def hit_fields(r):
+    # One flat shape for every DDGS result type.
+    images = r.get("images") if isinstance(r.get("images"), dict) else {}
+    return {"title": r.get("title"), "url": r.get("href") or r.get("url") or r.get("content"),
+            "snippet": r.get("body") or r.get("description"), "date": r.get("date") or r.get("published"),
+            "source": r.get("source") or r.get("publisher"), "image": r.get("image") or r.get("thumbnail") or images.get("medium")}
+
+def api_search_params(params):
+    # Validates one search from query args or a batch item; raises ValueError.
+    query = params.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError("query is required")
+    search_type = params.get("type") or "text"
+    if not isinstance(search_type, str) or search_type not in SEARCH_CACHE_TTLS:
+        raise ValueError(f"unknown type {search_type!r}")
+    news_category = params.get("news_category") or None
+    if news_category is not None and (not isinstance(news_category, str) or news_category not in dict(NEWS_CATEGORIES)):
+        raise ValueError(f"unknown news_category {news_category!r}")
+    try:
+        page = max(int(params.get("page") or 1), 1)
+    except (TypeError, ValueError):
+        raise ValueError("page must be an integer")
+    fields = params.get("fields") or API_DEFAULT_FIELDS
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+    if not isinstance(fields, (list, tuple)):
+        raise ValueError("fields must be a list or a comma-separated string")
+    unknown = [field for field in fields if not isinstance(field, str) or field not in API_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields {unknown}; choose from {list(API_FIELDS)}")
+    return dict(query=query, search_type=search_type, news_category=news_category, page=page, fields=tuple(fields))
+
+def search_api(query, search_type="text", news_category=None, page=1, fields=API_DEFAULT_FIELDS, deadline=None,
+               tier=TIER_FULL):
+    # The /results pipeline without the page: only the enrichment the
+    # requested fields need (and the degradation tier allows) is scheduled,
+    # all of it against one deadline.
+    deadline = deadline or time.monotonic() + PAGE_DEADLINE
+    entry = search_entry(query, page * SEARCH_PAGE_SIZE + SEARCH_PREFETCH, search_type, news_category,
+                         cache_only=tier >= TIER_CACHED_ONLY)
+    if entry is None:
+        raise NotCached("busy and this search is not cached yet, retry shortly")
+    results = entry["results"]
+    hits = [hit_fields(r) for r in results[(page - 1) * SEARCH_PAGE_SIZE:page * SEARCH_PAGE_SIZE]]
+
+    tasks = []
+    favicons = {}
+    if "favicon" in fields:
+        for domain in {get_website_name(hit["url"]) for hit in hits if hit["url"]}:
+            favicons[domain] = favicon_service.lookup(domain)
+            if favicons[domain] is None and tier < TIER_CACHED_ONLY:
+                tasks.append((("favicon", domain), f"https://{domain}/", favicon_service.resolve, domain))
+    for i, hit in enumerate(hits):
+        if not hit["url"]:
+            continue
+        if ("price" in fields or "product_image" in fields) and tier < TIER_NO_SCRAPES:
+            tasks.append((("price", i), hit["url"], extract_price_and_image, hit["url"]))
+        if "summary" in fields and tier < TIER_SNIPPETS:
+            tasks.append((("summary", i), hit["url"], summarize_page, hit["url"], deadline))
+    summary_urls = []
+    if "ai_summary" in fields and tier < TIER_SNIPPETS:
+        summary_urls = [r.get("href") or r.get("url") for r in results[:2]]
+    for i, url in enumerate(summary_urls):
         if url:
-            result["favicon"] = get_favicon_url(url)
-        if search_type == "news":
-            result["thumbnail"] = result.get("image", "https://via.placeholder.com/100x100?text=No+Image")
-        if search_type == "shopping":
-            price, image = extract_price_and_image(url)
-            result["price"] = price
-            result["thumbnail"] = image
-
-    summary = None
-    if search_type == "text":
-        all_text = ""
-        for r in results[:2]:
+            tasks.append((("content", i), url, fetch_page_content, url))
+    done = fetch_scheduler.run(tasks, deadline)
+
+    for i, hit in enumerate(hits):
+        if "favicon" in fields and hit["url"]:
+            domain = get_website_name(hit["url"])
+            hit["favicon"] = favicons.get(domain) or done.get(("favicon", domain)) or fallback_favicon_url(hit["url"])
+        if ("price", i) in done:
+            hit["price"], hit["product_image"] = done[("price", i)]
+        hit["summary"] = done.get(("summary", i))
+    body = {"query": query, "type": search_type, "news_category": news_category, "page": page,
+            "total_pages": (len(results) + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE, "more": not entry["exhausted"],
+            "results": [{field: hit[field] for field in fields if hit.get(field) is not None} for hit in hits]}
+    if summary_urls:
+        body["ai_summary"] = summarize_contents((done.get(("content", i)) for i in range(len(summary_urls))), deadline)
+    elif "ai_summary" in fields:
+        body["ai_summary"] = snippet_summary(results)
+    return body
+
+@app.route("/api/search")
+def api_search():
+    try:
+        params = api_search_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        return jsonify(search_api(tier=g.get("degradation_tier", TIER_FULL), **params))
+    except NotCached as e:
+        admission.reject()
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(int(ADMISSION_HOLD))}
+
+@app.route("/api/search/batch", methods=["POST"])
+def api_search_batch():
+    # {"searches": [{"query", "type", "news_category", "page", "fields"}, ...],
+    #  "timeout": seconds}. Searches run concurrently against one shared
+    # deadline; each slot holds a result or an error, in request order.
+    payload = request.get_json(silent=True)
+    searches = payload.get("searches") if isinstance(payload, dict) else None
+    if not isinstance(searches, list) or not searches:
+        return jsonify({"error": "expected a JSON body with a non-empty 'searches' list"}), 400
+    if len(searches) > API_BATCH_MAX:
+        return jsonify({"error": f"at most {API_BATCH_MAX} searches per batch"}), 400
+    try:
+        timeout = float(payload.get("timeout", PAGE_DEADLINE))
+    except (TypeError, ValueError):
+        timeout = math.nan
+    # A non-positive or NaN timeout would report every slot as timed out
+    # while the searches still ran.
+    if not math.isfinite(timeout) or timeout <= 0:
+        return jsonify({"error": "timeout must be a positive number of seconds"}), 400
+    timeout = min(timeout, API_BATCH_MAX_TIMEOUT)
+    deadline = time.monotonic() + timeout
+
+    slots = []
+    for search in searches:
+        try:
+            params = api_search_params(search if isinstance(search, dict) else {})
+        except ValueError as e:
+            slots.append({"error": str(e)})
+            continue
+        context = contextvars.copy_context()
+        context.run(current_timing.set, RequestTiming(params["search_type"]))
+        slots.append(api_executor.submit(context.run, search_api, deadline=deadline,
+                                         tier=g.get("degradation_tier", TIER_FULL), **params))
+    futures = [slot for slot in slots if isinstance(slot, Future)]
+    wait(futures, timeout=max(deadline - time.monotonic(), 0))
+
+    out = []
+    for slot in slots:
+        if not isinstance(slot, Future):
+            out.append(slot)
+        elif not slot.done():
+            slot.cancel()
+            out.append({"error": "deadline exceeded"})
+        elif isinstance(slot.exception(), NotCached):
+            admission.reject()
+            out.append({"error": str(slot.exception())})
+        elif slot.exception() is not None:
+            app.logger.warning("Error in batch search: %s", slot.exception())
+            out.append({"error": "search failed"})
+        else:
+            out.append(slot.result())
+    return jsonify({"results": out})
+
+@app.route("/healthz")
+def healthz():
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz")
+def readyz():
+    # Ready once summaries can be served without waiting on a model load.
+    # A lazy worker loads the model on its first summary, which only comes
+    # once it is taking traffic, so it is ready until the load fails.
+    ready = summarizer_state["status"] in ("ready", "remote")
+    if SUMMARIZER_WARMUP == "lazy":
+        ready = summarizer_state["status"] != "failed"
+    return jsonify({"ready": ready, "summarizer": summarizer_state}), 200 if ready else 503
+
+@app.route("/stats")
+def stats():
+    return jsonify({"search_cache": search_cache.stats(), "document_cache": document_cache.stats(),
+                    "extraction_rules": extraction_rules.stats(),
+                    "summary_cache": summary_cache.stats(), "summary_batcher": summary_batcher.stats(),
+                    "summary_jobs": summary_jobs.stats(), "favicons": favicon_service.stats(),
+                    "single_flight": {flight.name: flight.stats() for flight in single_flights()},
+                    "prefetch": prefetcher.stats(),
+                    "http": http_pool_stats(), "hosts": host_health.stats(), "admission": admission.stats(),
+                    "summarizers": summarizer_stats()})
+
+# /debug/hosts lists every domain recently scraped for users' searches, with
+# error strings, so it is off unless DEBUG_ENDPOINTS=1.
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "0") == "1"
+
+@app.route("/debug/hosts")
+def debug_hosts():
+    if not DEBUG_ENDPOINTS:
+        return jsonify({"error": "not found"}), 404
+    # Slowest hosts first, or only those in one breaker state with ?state=open.
+    table = host_health.table()
+    state = request.args.get("state")
+    rows = [dict(row, host=host) for host, row in table.items() if not state or row["state"] == state]
+    rows.sort(key=lambda row: row["p95"] or 0, reverse=True)
+    return jsonify({"stats": host_health.stats(), "hosts": rows})
+
+def single_flights():
+    return [search_flight, document_flight, summary_flight, favicon_service.flight]
+
+@app.before_request
+def start_summarizer_warmup():
+    if not SUMMARIZER_URL and SUMMARIZER_WARMUP == "background":
+        start_warmup()
+
+@app.before_request
+def start_request_timing():
+    search_type = request.args.get("type", "text") if request.endpoint in ("results", "api_search") else "none"
+    current_timing.set(RequestTiming(search_type if search_type in SEARCH_CACHE_TTLS else "other"))
+
+@app.before_request
+def admit_request():
+    if ADMISSION_CONTROL and request.endpoint in ("results", "api_search", "api_search_batch"):
+        g.degradation_tier = admission.admit()
+        g.admitted = True
+
+@app.after_request
+def add_server_timing(response):
+    timing = current_timing.get()
+    if SERVER_TIMING and timing is not None and timing.stages:
+        response.headers["Server-Timing"] = timing.header()
+    return response
+
+@app.after_request
+def add_degradation_tier(response):
+    # A streamed page is still being produced after this returns, so the
+    # request only counts out once the response is closed.
+    if g.get("admitted"):
+        response.headers["X-Degradation-Tier"] = TIER_NAMES[g.degradation_tier]
+        response.call_on_close(admission.release)
+        g.admitted = False
+    return response
+
+@app.teardown_request
+def release_admission(exc):
+    if g.get("admitted"):
+        admission.release()
+
+def metric_lines(name, kind, help_text, samples):
+    # samples is a list of (labels dict, value).
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return lines
+
+@app.route("/metrics")
+def metrics():
+    caches = {"search": search_cache, "document": document_cache, "summary": summary_cache, "favicon": favicon_cache,
+              "extraction_rules": extraction_rules}
+    cache_stats = {name: cache.stats() for name, cache in caches.items()}
+    http = http_pool_stats()
+    jobs = summary_jobs.stats()
+    favicons = favicon_service.stats()
+    lines = stage_histograms.render("starry_stage_duration_seconds")
+    for field in ("hits", "misses", "evictions"):
+        lines += metric_lines(f"starry_cache_{field}_total", "counter", f"Cache {field} in this worker.",
+                              [({"cache": name}, stats[field]) for name, stats in cache_stats.items()])
+    lines += metric_lines("starry_cache_bytes", "gauge", "Bytes held by each cache.",
+                          [({"cache": name}, stats["bytes"] or 0) for name, stats in cache_stats.items()])
+    for field in ("requests", "connections_opened", "connections_reused", "truncated", "bytes_read"):
+        lines += metric_lines(f"starry_http_{field}_total", "counter", f"Outbound HTTP {field.replace('_', ' ')}.",
+                              [({}, http[field])])
+    lines += metric_lines("starry_summary_jobs_total", "counter", "Summary jobs by outcome.",
+                          [({"outcome": field}, jobs[field]) for field in ("submitted", "deduped", "rejected", "completed", "failed")])
+    lines += metric_lines("starry_summary_queue_depth", "gauge", "Summary jobs waiting for a worker.", [({}, jobs["depth"])])
+    flights = {flight.name: flight.stats() for flight in single_flights()}
+    lines += metric_lines("starry_single_flight_calls_total", "counter", "Coalesced calls; joined callers reused a leader's result.",
+                          [({"flight": name, "role": role}, stats[role]) for name, stats in flights.items() for role in ("leaders", "joined")])
+    lines += metric_lines("starry_favicon_probes_total", "counter", "Favicon probes by outcome.",
+                          [({"outcome": field}, favicons[field]) for field in ("found", "missing", "errors")])
+    hosts = host_health.stats()
+    lines += metric_lines("starry_host_breaker_trips_total", "counter", "Times a host's circuit breaker opened.", [({}, hosts["trips"])])
+    lines += metric_lines("starry_host_skipped_total", "counter", "Requests skipped because the host's circuit was open.",
+                          [({}, hosts["skipped"])])
+    lines += metric_lines("starry_hosts", "gauge", "Tracked hosts by breaker state.",
+                          [({"state": state}, hosts[state]) for state in ("open", "half_open")])
+    summarizers = summarizer_stats()
+    lines += metric_lines("starry_summaries_total", "counter", "Summaries by summarizer.",
+                          [({"summarizer": name}, summarizers[name]) for name in SUMMARIZERS])
+    lines += metric_lines("starry_summary_over_budget_total", "counter", "Summaries moved to the extractive summarizer "
+                          "because the abstractive one was over SUMMARY_BUDGET.", [({}, summarizers["over_budget"])])
+    admitted = admission.stats()
+    lines += metric_lines("starry_degradation_tier", "gauge", "Current degradation tier (0 = full).", [({}, admitted["tier"])])
+    lines += metric_lines("starry_admission_requests_total", "counter", "Admitted search requests by degradation tier.",
+                          [({"tier": name}, count) for name, count in admitted["requests"].items()])
+    lines += metric_lines("starry_admission_rejected_total", "counter", "Cached-only requests refused with 503 on a cache miss.",
+                          [({}, admitted["rejected"])])
+    lines += metric_lines("starry_admission_signal", "gauge", "Inputs to the degradation tier.",
+                          [({"signal": name}, admitted[name]) for name in ("in_flight", "summary_queue", "cpu")
+                           if admitted[name] is not None])
+    prefetch = prefetcher.stats()
+    lines += metric_lines("starry_prefetch_total", "counter", "Prefetch plans and steps by outcome.",
+                          [({"outcome": field}, prefetch[field]) for field in ("scheduled", "duplicate", "dropped", "steps", "cancelled", "failed")])
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+def prewarm_summaries(query, timeout=60):
+    # Runs the same fetch + summarize work a text and a stories search for
+    # query would, so the summaries land in summary_cache ahead of users.
+    # Only abstractive summaries are cached, so it is passed explicitly
+    # (choose_summarizer would go extractive while the model loads) and
+    # types configured for the extractive summarizer are skipped.
+    warm = {search_type for search_type in ("text", "stories")
+            if SUMMARIZERS.get(SUMMARIZER_BY_TYPE.get(search_type, SUMMARIZER_DEFAULT), abstractive_summarizer)
+            is abstractive_summarizer}
+    tasks = []
+    deadline = time.monotonic() + timeout
+    if "text" in warm:
+        for i, r in enumerate(cached_search(query, search_type="text")[:2]):
             url = r.get("href") or r.get("url")
             if url:
-                content = fetch_page_content(url)
-                if content:
-                    all_text += content + "\n"
-        if all_text.strip():
-            summary = summarize_text(all_text)
-        else:
-            summary = "Unable to generate summary due to lack of fetchable content."
-
-    news_categories = [
-        ("general", "🗞️ General News"),
-        ("political", "⚖️ Political News"),
-        ("business", "💹 Business & Finance News"),
-        ("technology", "🤖 Technology News"),
-        ("education", "🎓 Education News"),
-        ("entertainment", "🎭 Entertainment News"),
-        ("sports", "🏆 Sports News"),
-        ("weather", "🌦️ Weather News"),
-        ("science", "🌐 Science News"),
-        ("health", "🧘 Health News")
-    ]
-
-    return render_template_string('''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Search Results - Starry Search</title>
-            <style>
-                body {
-                    background: linear-gradient(to bottom, #0f0c29, #302b63);
-                    color: white;
-                    font-family: 'Arial', sans-serif;
-                    padding: 2rem;
-                    max-width: 1200px;
-                    margin: 0 auto;
-                }
-                h2 {
-                    color: #fff;
-                    margin-bottom: 1rem;
-                }
-                h3 {
-                    color: #ccc;
-                    margin: 1.5rem 0;
-                }
-                .search-bar {
-                    margin-bottom: 1rem;
-                }
-                .search-bar form {
-                    display: flex;
-                    align-items: center;
-                }
-                .search-bar input {
-                    padding: 10px;
-                    width: 500px;
-                    border: none;
-                    border-radius: 20px 0 0 20px;
-                    font-size: 1rem;
-                    outline: none;
-                }
-                .search-bar button {
-                    padding: 10px 20px;
-                    background: #4e54c8;
-                    color: white;
-                    border: none;
-                    border-radius: 0 20px 20px 0;
-                    cursor: pointer;
-                    transition: background 0.3s ease;
-                }
-                .search-bar button:hover {
-                    background: #6a6fd1;
-                }
-                .tabs {
-                    display: flex;
-                    gap: 10px;
-                    margin-bottom: 2rem;
-                }
-                .tabs a {
-                    padding: 10px 20px;
-                    background: rgba(255,255,255,0.1);
-                    color: white;
-                    text-decoration: none;
-                    border-radius: 20px;
-                    transition: all 0.3s ease;
-                }
-                .tabs a:hover {
-                    background: rgba(255,255,255,0.2);
-                }
-                .tabs a.active {
-                    background: #4e54c8;
-                }
-                .news-categories {
-                    margin-bottom: 1rem;
-                }
-                .news-categories select {
-                    padding: 10px;
-                    background: rgba(255,255,255,0.1);
-                    color: white;
-                    border: none;
-                    border-radius: 20px;
-                    font-size: 1rem;
-                    cursor: pointer;
-                    outline: none;
-                }
-                .news-categories select option {
-                    background: #0f0c29;
-                }
-                .top-stories {
-                    display: flex;
-                    gap: 20px;
-                    margin-bottom: 2rem;
-                }
-                .primary-story {
-                    flex: 2;
-                    background: rgba(255,255,255,0.1);
-                    padding: 20px;
-                    border-radius: 8px;
-                    transition: transform 0.2s;
-                }
-                .primary-story:hover {
-                    transform: scale(1.02);
-                }
-                .primary-story img.thumbnail {
-                    width: 100%;
-                    height: 400px;
-                    object-fit: cover;
-                    border-radius: 8px;
-                    margin-bottom: 15px;
-                }
-                .primary-story h4 {
-                    margin: 0 0 10px 0;
-                    font-size: 1.8rem;
-                }
-                .primary-story .website {
-                    font-size: 1.1rem;
-                    color: #90ee90;
-                    margin-bottom: 5px;
-                }
-                .primary-story img.favicon {
-                    width: 24px;
-                    height: 24px;
-                    vertical-align: middle;
-                    margin-right: 5px;
-                }
-                .secondary-stories {
-                    flex: 1;
-                    display: flex;
-                    flex-direction: column;
-                    gap: 15px;
-                }
-                .secondary-story {
-                    background: rgba(255,255,255,0.1);
-                    padding: 15px;
-                    border-radius: 8px;
-                    transition: transform 0.2s;
-                }
-                .secondary-story:hover {
-                    transform: scale(1.02);
-                }
-                .secondary-story img.thumbnail {
-                    width: 100%;
-                    height: 150px;
-                    object-fit: cover;
-                    border-radius: 8px;
-                    margin-bottom: 10px;
-                }
-                .secondary-story h5 {
-                    margin: 0 0 8px 0;
-                    font-size: 1.2rem;
-                }
-                .secondary-story .website {
-                    font-size: 0.9rem;
-                    color: #90ee90;
-                    margin-bottom: 5px;
-                }
-                .secondary-story img.favicon {
-                    width: 16px;
-                    height: 16px;
-                    vertical-align: middle;
-                    margin-right: 5px;
-                }
-                .result {
-                    background: rgba(255,255,255,0.1);
-                    padding: 1rem;
-                    border-radius: 8px;
-                    margin-bottom: 1rem;
-                    display: flex;
-                    align-items: center;
-                    gap: 15px;
-                }
-                .result img.favicon {
-                    width: 16px;
-                    height: 16px;
-                    margin-right: 10px;
-                }
-                .result img.thumbnail {
-                    width: 100px;
-                    height: 100px;
-                    object-fit: cover;
-                    border-radius: 4px;
-                }
-                .shopping-grid {
-                    display: grid;
-                    grid-template-columns: repeat(auto-fill, minmax(250px, 1fr));
-                    gap: 20px;
-                }
-                .shopping-result {
-                    background: rgba(255,255,255,0.1);
-                    padding: 15px;
-                    border-radius: 8px;
-                    text-align: center;
-                    transition: transform 0.2s;
-                }
-                .shopping-result:hover {
-                    transform: scale(1.05);
-                }
-                .shopping-result img {
-                    max-width: 150px;
-                    height: 150px;
-                    object-fit: contain;
-                    border-radius: 4px;
-                    margin-bottom: 10px;
-                }
-                .image-grid {
-                    display: grid;
-                    grid-template-columns: repeat(auto-fill, minmax(200px, 1fr));
-                    gap: 10px;
-                }
-                .image-result {
-                    background: rgba(255,255,255,0.1);
-                    padding: 10px;
-                    border-radius: 8px;
-                    text-align: center;
-                }
-                .image-result img {
-                    max-width: 100%;
-                    height: auto;
-                    border-radius: 4px;
-                }
-                a {
-                    color: #6a6fd1;
-                    text-decoration: none;
-                }
-                a:hover {
-                    text-decoration: underline;
-                }
-                .snippet {
-                    color: #d3d3d3;
-                    font-size: 0.9rem;
-                    margin-top: 5px;
-                }
-                .price {
-                    color: #90ee90;
-                    font-weight: bold;
-                    font-size: 1.1rem;
-                    margin-top: 5px;
-                }
-                .pagination {
-                    margin-top: 2rem;
-                    text-align: center;
-                }
-                .pagination a, .pagination span {
-                    padding: 0.5rem 1rem;
-                    margin: 0 0.2rem;
-                    background: rgba(255,255,255,0.1);
-                    border-radius: 4px;
-                    color: white;
-                    text-decoration: none;
-                }
-                .pagination a:hover {
-                    background: rgba(255,255,255,0.2);
-                }
-                .pagination .current {
-                    background: #4e54c8;
-                }
-            </style>
-        </head>
-        <body>
-            <div class="search-bar">
-                <form method="POST" action="{{ url_for('results', type=search_type) }}">
-                    <input name="query" value="{{query}}" placeholder="Search the universe..." required>
-                    <button type="submit">Search</button>
-                </form>
-            </div>
-
-            <h2>Results for: {{query}}</h2>
-
-            <div class="tabs">
-                <a href="{{ url_for('results', query=query, type='text', page=1) }}" class="{% if search_type == 'text' %}active{% endif %}">Text</a>
-                <a href="{{ url_for('results', query=query, type='news', page=1) }}" class="{% if search_type == 'news' %}active{% endif %}">News</a>
-                <a href="{{ url_for('results', query=query, type='image', page=1) }}" class="{% if search_type == 'image' %}active{% endif %}">Images</a>
-                <a href="{{ url_for('results', query=query, type='video', page=1) }}" class="{% if search_type == 'video' %}active{% endif %}">Videos</a>
-                <a href="{{ url_for('results', query=query, type='shopping', page=1) }}" class="{% if search_type == 'shopping' %}active{% endif %}">Shopping</a>
-                <a href="{{ url_for('results', query=query, type='stories', page=1) }}" class="{% if search_type == 'stories' %}active{% endif %}">Stories</a>
-            </div>
-
-            {% if search_type == "news" %}
-                <div class="news-categories">
-                    <form method="GET" action="{{ url_for('results') }}">
-                        <input type="hidden" name="query" value="{{query}}">
-                        <input type="hidden" name="type" value="news">
-                        <input type="hidden" name="page" value="1">
-                        <select name="news_category" onchange="this.form.submit()">
-                            <option value="" {% if not news_category %}selected{% endif %}>All News</option>
-                            {% for value, label in news_categories %}
-                                <option value="{{value}}" {% if news_category == value %}selected{% endif %}>{{label}}</option>
-                            {% endfor %}
-                        </select>
-                    </form>
-                </div>
-            {% endif %}
-
-            {% if search_type == "stories" and top_stories %}
-                <div class="top-stories">
-                    <div class="primary-story">
-                        <img src="{{ top_stories[0].get('thumbnail') }}" class="thumbnail" alt="{{ top_stories[0].get('title', 'No Title') }}">
-                        <h4><a href="{{ top_stories[0].get('url') }}">{{ top_stories[0].get("title", "No Title") }}</a></h4>
-                        <div class="website">
-                            <img src="{{ top_stories[0].get('favicon') }}" class="favicon" alt="favicon">
-                            {{ top_stories[0].get("website") }}
-                        </div>
-                        <div class="snippet">{{ top_stories[0].get("summary") }}</div>
-                        <span>{{ human_readable_time_ago(top_stories[0].get("date", "")) }}</span>
-                    </div>
-                    <div class="secondary-stories">
-                        {% for story in top_stories[1:] %}
-                            <div class="secondary-story">
-                                <img src="{{ story.get('thumbnail') }}" class="thumbnail" alt="{{ story.get('title', 'No Title') }}">
-                                <h5><a href="{{ story.get('url') }}">{{ story.get("title", "No Title")[:50] ~ "..." if story.get("title", "No Title")|length > 50 else story.get("title", "No Title") }}</a></h5>
-                                <div class="website">
-                                    <img src="{{ story.get('favicon') }}" class="favicon" alt="favicon">
-                                    {{ story.get("website") }}
-                                </div>
-                                <div class="snippet">{{ story.get("summary")[:100] ~ "..." if story.get("summary")|length > 100 else story.get("summary") }}</div>
-                                <span>{{ human_readable_time_ago(story.get("date", "")) }}</span>
-                            </div>
-                        {% endfor %}
-                    </div>
-                </div>
-            {% endif %}
-
-            {% if search_type == "text" and summary %}
-                <h3>🧠 AI Summary:</h3>
-                <div class="result">
-                    <p>{{ summary }}</p>
-                </div>
-            {% endif %}
-
-            {% if search_type == "image" %}
-                <div class="image-grid">
-                    {% for r in page_results %}
-                        <div class="image-result">
-                            <img src="{{ r.get('image') or r.get('content') }}" alt="{{ r.get('title', 'No Title') }}">
-                            <div><a href="{{ r.get('url') }}">{{ r.get("title", "No Title") }}</a></div>
-                            <img src="{{ r.get('favicon') }}" class="favicon" alt="favicon">
-                        </div>
-                    {% endfor %}
-                </div>
-            {% elif search_type == "shopping" %}
-                <div class="shopping-grid">
-                    {% for r in page_results %}
-                        <div class="shopping-result">
-                            <img src="{{ r.get('thumbnail') }}" alt="{{ r.get('title', 'No Title') }}">
-                            <div><a href="{{ r.get('href') or r.get('url') }}">{{ r.get("title", "No Title")[:50] ~ "..." if r.get("title", "No Title")|length > 50 else r.get("title", "No Title") }}</a></div>
-                            <div class="price">{{ r.get("price", "Price not found") }}</div>
-                            <img src="{{ r.get('favicon') }}" class="favicon" alt="favicon">
-                        </div>
-                    {% endfor %}
-                </div>
-            {% elif search_type != "stories" %}
-                {% for r in page_results %}
-                    <div class="result">
-                        {% if search_type == "text" %}
-                            <img src="{{ r.get('favicon') }}" class="favicon" alt="favicon">
-                            <div>
-                                <b>{{ loop.index0 + start_idx + 1 }}. {{ r.get("title", "No Title") }}</b><br>
-                                <a href="{{ r.get('href') or r.get('url') }}">{{ r.get('href') or r.get('url') }}</a>
-                                <div class="snippet">{{ r.get("body", "No description available.") }}</div>
-                            </div>
-                        {% elif search_type == "news" %}
-                            <img src="{{ r.get('thumbnail') }}" class="thumbnail" alt="thumbnail">
-                            <div>
-                                <img src="{{ r.get('favicon') }}" class="favicon" alt="favicon">
-                                <b>{{ loop.index0 + start_idx + 1 }}. {{ r.get("title", "No Title") }} ({{ human_readable_time_ago(r.get("date", "")) }})</b><br>
-                                <div class="snippet">{{ r.get("body", "No description available.") }}</div>
-                                <a href="{{ r.get('url') }}">{{ r.get('url') }}</a>
-                            </div>
-                        {% elif search_type == "video" %}
-                            <img src="{{ r.get('favicon') }}" class="favicon" alt="favicon">
-                            <div>
-                                <b>{{ loop.index0 + start_idx + 1 }}. {{ r.get("title", "No Title") }}</b><br>
-                                {{ r.get("content", "") }}<br>
-                                <a href="{{ r.get('url') }}">Watch Video</a>
-                            </div>
-                        {% endif %}
-                    </div>
-                {% endfor %}
-            {% endif %}
-
-            {% if search_type != "stories" %}
-            <div class="pagination">
-                {% if page > 1 %}
-                    <a href="{{ url_for('results', query=query, type=search_type, news_category=news_category, page=page-1) }}">Previous</a>
-                {% endif %}
-                
-                {% for p in range(1, total_pages + 1) %}
-                    {% if p == page %}
-                        <span class="current">{{ p }}</span>
-                    {% else %}
-                        <a href="{{ url_for('results', query=query, type=search_type, news_category=news_category, page=p) }}">{{ p }}</a>
-                    {% endif %}
-                {% endfor %}
-                
-                {% if page < total_pages %}
-                    <a href="{{ url_for('results', query=query, type=search_type, news_category=news_category, page=page+1) }}">Next</a>
-                {% endif %}
-            </div>
-            {% endif %}
-        </body>
-        </html>
-    ''', query=query, search_type=search_type, news_category=news_category, results=results, page_results=page_results,
-       page=page, total_pages=total_pages, start_idx=start_idx, summary=summary, news_categories=news_categories,
-       top_stories=top_stories, fetch_page_content=fetch_page_content, summarize_text=summarize_text,
-       human_readable_time_ago=human_readable_time_ago)
+                tasks.append((("content", i), url, run_as, "text", fetch_page_content, url))
+    if "stories" in warm:
+        for i, story in enumerate(cached_search(query, max_results=5, search_type="stories")[:5]):
+            url = story.get("url")
+            if url:
+                tasks.append((("story_summary", i), url, run_as, "stories", summarize_page, url, deadline,
+                              abstractive_summarizer))
+    done = fetch_scheduler.run(tasks, deadline)
+    warmed = sum(1 for (kind, _), value in done.items() if kind == "story_summary" and value)
+    contents = [done.get(("content", i)) for i in range(2)]
+    if any(contents):
+        run_as("text", summarize_contents, contents, None, abstractive_summarizer)
+        warmed += 1
+    return warmed
+
+@app.cli.command("prewarm-summaries")
+@click.argument("queries", nargs=-1)
+@click.option("--file", "query_file", type=click.File(), help="Read one query per line from this file.")
+def prewarm_summaries_command(queries, query_file):
+    """Summarize text and stories results for trending queries ahead of time."""
+    # The summaries have to outlive this process: in the shared sqlite cache,
+    # or in the model server's cache when SUMMARIZER_URL is set.
+    if SUMMARY_CACHE_BACKEND != "sqlite" and not SUMMARIZER_URL:
+        raise click.ClickException("the summary cache is in-memory, so nothing would survive this command; "
+                                   "set SUMMARY_CACHE_BACKEND=sqlite (and the web workers' CACHE_PATH) or SUMMARIZER_URL")
+    if not SUMMARIZER_URL:
+        get_summarizer()
+    queries = list(queries)
+    if query_file:
+        queries += [line.strip() for line in query_file if line.strip()]
+    for query in queries:
+        started = time.monotonic()
+        count = prewarm_summaries(query)
+        click.echo(f"{query}: {count} summaries warmed in {time.monotonic() - started:.1f}s")
+
+model_server = Flask("model_server")
+
+@model_server.route("/summarize", methods=["POST"])
+def model_server_summarize():
+    payload = request.get_json(force=True)
+    text = payload.get("text") or ""
+    # Web workers have already chosen the abstractive path by calling here.
+    if payload.get("mode") == "long":
+        return jsonify({"summary": summarize_long_text(text, abstractive_summarizer)})
+    return jsonify({"summary": summarize_text(text, abstractive_summarizer)})
+
+@model_server.route("/healthz")
+def model_server_health():
+    return jsonify({"status": "ok", "backend": summarizer_state["backend"] or SUMMARIZER_BACKEND,
+                    "summary_batcher": summary_batcher.stats()})
+
+@app.cli.command("model-server")
+@click.option("--host", default="127.0.0.1", help="Interface to listen on, or unix:///path/to.sock.")
+@click.option("--port", default=8500, type=int)
+@click.option("--batching/--no-batching", default=True, help="Batch concurrent requests from all web workers.")
+def model_server_command(host, port, batching):
+    """Own the summarizer model in one process and serve it to the web workers."""
+    global SUMMARIZER_URL, SUMMARY_BATCHING
+    from werkzeug.serving import run_simple
+    SUMMARIZER_URL = None
+    SUMMARY_BATCHING = batching
+    get_summarizer()
+    run_simple(host, port, model_server, threaded=True)
 
 if __name__ == "__main__":
     app.run(debug=True)
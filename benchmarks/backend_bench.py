@@ -0,0 +1,88 @@
+"""Latency, memory and ROUGE loss of each summarizer inference backend.
+
+Every backend runs in its own subprocess (SUMMARIZER_BACKEND=<name>), so each
+RSS figure covers only that backend's model. Each subprocess summarizes the
+texts in benchmarks/fixtures/articles.json. The parent scores every backend's
+summaries with ROUGE-1/2/L F1 against the first backend listed (fp32 by
+default), so the table shows quality lost against speed gained.
+
+Usage: python benchmarks/backend_bench.py [--backends fp32,int8,onnx] [--repeat 1]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from rouge import rouge_scores
+
+ARTICLES = os.path.join(HERE, "fixtures", "articles.json")
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def worker(repeat):
+    started = time.perf_counter()
+    import app
+    load_seconds = time.perf_counter() - started
+    with open(ARTICLES) as f:
+        texts = [article["text"] for article in json.load(f)]
+    app.run_summarizer(texts[0])
+    latencies = []
+    outputs = []
+    for text in texts:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            summary = app.run_summarizer(text)
+            latencies.append(time.perf_counter() - started)
+        outputs.append(summary)
+    json.dump({"load_seconds": load_seconds, "latencies": latencies, "outputs": outputs, "rss_mb": rss_mb()}, sys.stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="fp32,int8,onnx")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args.repeat)
+
+    results = {}
+    for backend in args.backends.split(","):
+        # eager, so the model is loaded inside the timed import.
+        env = dict(os.environ, SUMMARIZER_BACKEND=backend, SUMMARIZER_WARMUP="eager")
+        proc = subprocess.run([sys.executable, __file__, "--worker", "--repeat", str(args.repeat)],
+                              env=env, capture_output=True, text=True)
+        if proc.returncode:
+            print(f"{backend}: failed\n{proc.stderr[-2000:]}")
+            continue
+        results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    if not results:
+        return
+    reference_name = next(iter(results))
+    reference = results[reference_name]["outputs"]
+    base_latency = statistics.mean(results[reference_name]["latencies"])
+    print(f"ROUGE F1 is measured against {reference_name} output.")
+    print(f"{'backend':<8} {'load s':>7} {'mean s':>7} {'p95 s':>7} {'speedup':>8} {'RSS MB':>8} "
+          f"{'R-1':>6} {'R-2':>6} {'R-L':>6}")
+    for backend, result in results.items():
+        latencies = result["latencies"]
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        scores = [rouge_scores(out, ref) for out, ref in zip(result["outputs"], reference)]
+        mean_score = {key: statistics.mean(score[key] for score in scores) for key in scores[0]}
+        print(f"{backend:<8} {result['load_seconds']:>7.1f} {statistics.mean(latencies):>7.2f} {p95:>7.2f} "
+              f"{base_latency / statistics.mean(latencies):>7.2f}x {result['rss_mb']:>8.0f} "
+              f"{mean_score['rouge1']:>6.3f} {mean_score['rouge2']:>6.3f} {mean_score['rougeL']:>6.3f}")
+
+if __name__ == "__main__":
+    main()
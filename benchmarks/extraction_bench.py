@@ -0,0 +1,102 @@
+"""Compare the original fetch/parse path with the full and streaming extractors.
+
+Serves the saved pages in benchmarks/fixtures/pages from a local server and,
+for each page, reports mean wall time and body bytes read for:
+
+  original  the pre-cache code: fetch_page_content and extract_price_and_image
+            each download the page and build a full html.parser tree
+  full      app.load_document with EXTRACTION_MODE=full (one fetch, one parse)
+  stream    app.stream_document (stops once paragraphs/image/price are found)
+
+Usage: python benchmarks/extraction_bench.py [--repeat 20] [--kbps 0]
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from bs4 import BeautifulSoup
+
+import app
+from fixture_server import start_fixture_server, fixture_pages
+
+def original_fetch_page_content(url):
+    response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, "html.parser")
+    return "\n".join([p.get_text() for p in soup.find_all("p")[:3]]), len(response.content)
+
+def original_extract_price_and_image(url):
+    response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10)
+    soup = BeautifulSoup(response.text, "html.parser")
+    price = "Price not found"
+    for tag in soup.find_all(['span', 'div', 'p'], class_=app.PRICE_CLASSES):
+        text = tag.get_text().strip()
+        for pattern in app.PRICE_PATTERNS:
+            match = re.search(pattern, text)
+            if match:
+                price = match.group()
+                break
+        if price != "Price not found":
+            break
+    image = app.PLACEHOLDER_IMAGE
+    for img in soup.find_all('img', class_=app.IMAGE_CLASSES):
+        if img.get('src'):
+            image = img['src']
+            if not image.startswith('http'):
+                image = urlparse(url).scheme + "://" + urlparse(url).netloc + image
+            break
+    return (price, image), len(response.content)
+
+def run_original(url):
+    text, text_bytes = original_fetch_page_content(url)
+    (price, image), image_bytes = original_extract_price_and_image(url)
+    return (text, price, image), text_bytes + image_bytes
+
+def run_app(loader):
+    def run(url):
+        before = app.http_pool_stats()["bytes_read"]
+        doc = loader(url)
+        read = app.http_pool_stats()["bytes_read"] - before
+        return ("\n".join(doc.paragraphs[:3]), doc.price, doc.image), read
+    return run
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--kbps", type=int, default=0, help="throttle the fixture server (0 = unthrottled)")
+    args = parser.parse_args()
+
+    server, base = start_fixture_server(kbps=args.kbps)
+    modes = [
+        ("original", run_original),
+        ("full", run_app(lambda url: app.Document(url, app.http_get(url).text))),
+        ("stream", run_app(app.stream_document)),
+    ]
+    print(f"{'page':<20} {'mode':<9} {'mean ms':>9} {'p95 ms':>9} {'bytes':>9}  same as full")
+    for page in fixture_pages():
+        url = f"{base}/{page}"
+        reference = None
+        for name, run in modes:
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                output, read = run(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            if name == "full":
+                reference = output
+            same = "-" if reference is None or name == "full" else (
+                "yes" if output == reference else
+                "text" if output[0] == reference[0] else "no")
+            p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+            print(f"{page:<20} {name:<9} {statistics.mean(timings):>9.2f} {p95:>9.2f} {read:>9}  {same}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Latency of the extractive summarizer, and its overlap with distilbart.
+
+Summarizes every text in benchmarks/fixtures/articles.json with:
+
+  abstractive  app.run_summarizer, the distilbart pipeline (loaded before
+               timing starts)
+  extractive   app.ExtractiveSummarizer, TF-IDF TextRank in NumPy
+  lead         the first --sentences sentences, as a floor
+
+The extractive and lead summaries are scored with ROUGE-1/2/L F1 against
+the abstractive summary of the same article. Higher means closer to what
+the model would have said, not necessarily a better summary.
+
+Usage: python benchmarks/extractive_bench.py [--repeat 20] [--sentences 3]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import app
+from rouge import rouge_scores
+
+ARTICLES = os.path.join(HERE, "fixtures", "articles.json")
+
+def lead(text, sentences):
+    return " ".join(re.split(r"(?<=[.!?])\s+", text.strip())[:sentences])
+
+def run(summarize, texts, repeat):
+    latencies = []
+    outputs = []
+    for text in texts:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            summary = summarize(text)
+            latencies.append((time.perf_counter() - started) * 1000)
+        outputs.append(summary)
+    return latencies, outputs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="extractive and lead runs per article")
+    parser.add_argument("--sentences", type=int, default=app.SUMMARY_SENTENCES)
+    args = parser.parse_args()
+
+    with open(ARTICLES) as f:
+        texts = [article["text"] for article in json.load(f)]
+    extractive = app.ExtractiveSummarizer(sentences=args.sentences)
+    app.run_summarizer(texts[0])
+
+    results = {"abstractive": run(app.run_summarizer, texts, 1),
+               "extractive": run(extractive.summarize, texts, args.repeat),
+               "lead": run(lambda text: lead(text, args.sentences), texts, args.repeat)}
+    references = results["abstractive"][1]
+
+    print(f"{'summarizer':<12} {'mean ms':>9} {'p95 ms':>9} {'words':>6} {'rouge1':>7} {'rouge2':>7} {'rougeL':>7}")
+    for name, (latencies, outputs) in results.items():
+        words = statistics.mean(len(output.split()) for output in outputs)
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        row = f"{name:<12} {statistics.mean(latencies):>9.2f} {p95:>9.2f} {words:>6.0f}"
+        if name != "abstractive":
+            scores = [rouge_scores(output, reference) for output, reference in zip(outputs, references)]
+            row += "".join(f" {statistics.mean(s[key] for s in scores):>7.3f}" for key in ("rouge1", "rouge2", "rougeL"))
+        print(row)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import os
+import threading
+import time
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+PAGES = os.path.join(FIXTURES, "pages")
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    # Keep-alive static server for saved pages. kbps > 0 throttles the body
+    # so bandwidth savings show up as latency the way they would on the wire.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    kbps = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def copyfile(self, source, outputfile):
+        if not self.kbps:
+            return super().copyfile(source, outputfile)
+        chunk_size = 4096
+        delay = chunk_size / (self.kbps * 1024)
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            try:
+                outputfile.write(chunk)
+                outputfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                break
+            time.sleep(delay)
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Streaming clients hang up mid-body on purpose; that is not an error.
+        pass
+
+def start_fixture_server(directory=PAGES, kbps=0):
+    handler = type("ThrottledHandler", (FixtureHandler,), {"kbps": kbps})
+    server = FixtureServer(("127.0.0.1", 0), partial(handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def fixture_pages(directory=PAGES):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".html"))
@@ -0,0 +1,303 @@
+"""Offline load test for /results against recorded upstream fixtures.
+
+Nothing leaves the machine:
+
+  - DuckDuckGo is replaced by ReplayDDGS, which serves the responses saved
+    in benchmarks/fixtures/ddgs (one file per DDGS call: text, shopping,
+    news, images, videos).
+  - Every result URL is rewritten to one of --sites local fixture servers
+    serving benchmarks/fixtures/pages. Each server is a separate host:port,
+    so per-host limits and per-domain favicon caching behave as they would
+    with real sites.
+
+The app runs in --workers separate server processes, each starting with
+empty caches: in memory by default, or, with CACHE_BACKEND,
+SUMMARY_CACHE_BACKEND or FAVICON_CACHE_BACKEND set to sqlite, in a cache
+file of its own. The harness sends --warmup passes and then --requests
+requests per search type at --concurrency. It reports:
+
+  - p50/p95/p99 latency
+  - requests/sec
+  - peak RSS per worker
+
+Admission control is off in the workers (ADMISSION_CONTROL=0) so the
+numbers measure the full pipeline rather than degraded or 503 responses;
+with --admission it stays on and each type also reports how many responses
+came back degraded, by X-Degradation-Tier.
+
+The summarizer runs as configured by the environment. For example, set
+SUMMARIZER_URL to use a model server, or SUMMARIZER_WARMUP=eager to keep
+the model load out of the timings.
+
+Usage:
+  python benchmarks/loadtest.py [--types text,news,...] [--concurrency 8]
+                                [--requests 100] [--workers 1] [--admission] [--json out.json]
+  python benchmarks/loadtest.py --record "solar panels"   # refresh fixtures from DDGS
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from fixture_server import FIXTURES, start_fixture_server, fixture_pages
+
+DDGS_FIXTURES = os.path.join(FIXTURES, "ddgs")
+SEARCH_TYPES = ["text", "news", "image", "video", "shopping", "stories"]
+URL_KEYS = ("href", "url")
+
+def fixture_name(method, query):
+    # Shopping searches go through DDGS.text with a site: filter appended.
+    return "shopping" if method == "text" and "site:" in query else method
+
+def rewrite_urls(results, bases, pages):
+    # Maps each upstream domain to one fixture server and each result to a
+    # saved page, deterministically so repeated runs fetch the same things.
+    domains = sorted({urlparse(r[key]).netloc for r in results for key in URL_KEYS if r.get(key)})
+    hosts = {domain: bases[i % len(bases)] for i, domain in enumerate(domains)}
+    rewritten = []
+    for i, r in enumerate(results):
+        r = dict(r)
+        for key in URL_KEYS:
+            if r.get(key):
+                r[key] = f"{hosts[urlparse(r[key]).netloc]}/{pages[i % len(pages)]}"
+        rewritten.append(r)
+    return rewritten
+
+class ReplayDDGS:
+    fixtures = {}
+    latency = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _replay(self, method, query, max_results):
+        time.sleep(self.latency)
+        results = self.fixtures.get(fixture_name(method, query), [])
+        return [dict(r) for r in results[:max_results]]
+
+    def text(self, query, max_results=None, **kwargs):
+        return self._replay("text", query, max_results)
+
+    def news(self, query, max_results=None, **kwargs):
+        return self._replay("news", query, max_results)
+
+    def images(self, query, max_results=None, **kwargs):
+        return self._replay("images", query, max_results)
+
+    def videos(self, query, max_results=None, **kwargs):
+        return self._replay("videos", query, max_results)
+
+def serve(args):
+    import app
+    from werkzeug.serving import run_simple
+
+    bases = args.bases.split(",")
+    pages = fixture_pages()
+    for name in ("text", "shopping", "news", "images", "videos"):
+        with open(os.path.join(DDGS_FIXTURES, f"{name}.json")) as f:
+            ReplayDDGS.fixtures[name] = rewrite_urls(json.load(f), bases, pages)
+    ReplayDDGS.latency = args.search_latency
+    app.DDGS = ReplayDDGS
+    run_simple("127.0.0.1", args.port, app.app, threaded=True)
+
+def record(query):
+    # Runs each search type through the app's own search code against the
+    # real DDGS and saves what every DDGS call returned.
+    import app
+
+    recorded = {}
+    real_ddgs = app.DDGS
+
+    class RecordingDDGS(real_ddgs):
+        def _record(self, method, query, results):
+            results = list(results)
+            recorded[fixture_name(method, query)] = results
+            return results
+
+        def text(self, query, *args, **kwargs):
+            return self._record("text", query, super().text(query, *args, **kwargs))
+
+        def news(self, query, *args, **kwargs):
+            return self._record("news", query, super().news(query, *args, **kwargs))
+
+        def images(self, query, *args, **kwargs):
+            return self._record("images", query, super().images(query, *args, **kwargs))
+
+        def videos(self, query, *args, **kwargs):
+            return self._record("videos", query, super().videos(query, *args, **kwargs))
+
+    app.DDGS = RecordingDDGS
+    for search_type in ["text", "news", "image", "video", "shopping"]:
+        app.search_duckduckgo(query, max_results=100, search_type=search_type)
+    for name, results in recorded.items():
+        with open(os.path.join(DDGS_FIXTURES, f"{name}.json"), "w") as f:
+            json.dump(results, f, indent=1)
+            f.write("\n")
+        print(f"recorded {len(results)} results to fixtures/ddgs/{name}.json")
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+class RSSSampler(threading.Thread):
+    def __init__(self, pids, interval=0.2):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.peak = {pid: None for pid in pids}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        for pid in self.pids:
+            rss = rss_mb(pid)
+            if rss is not None and (self.peak[pid] is None or rss > self.peak[pid]):
+                self.peak[pid] = rss
+
+def start_workers(count, bases, search_latency, cache_dir, admission):
+    workers = []
+    for i in range(count):
+        port = free_port()
+        # CACHE_PATH only matters for caches the environment puts in sqlite.
+        env = dict(os.environ, CACHE_PATH=os.path.join(cache_dir, f"cache-{i}.sqlite3"),
+                   ADMISSION_CONTROL="1" if admission else "0")
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+                                    "--bases", ",".join(bases), "--search-latency", str(search_latency)],
+                                   env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        workers.append((process, f"http://127.0.0.1:{port}"))
+    for process, url in workers:
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                if requests.get(f"{url}/healthz", timeout=1).ok:
+                    break
+            except requests.RequestException:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise SystemExit(f"worker at {url} did not start")
+            time.sleep(0.2)
+    return workers
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+def drive(workers, search_type, queries, count, concurrency):
+    urls = [f"{workers[i % len(workers)][1]}/results?query={queries[i % len(queries)]}&type={search_type}&page={i % 3 + 1}"
+            for i in range(count)]
+
+    def one(url):
+        started = time.perf_counter()
+        try:
+            response = requests.get(url, timeout=60)
+            ok, tier = response.status_code == 200, response.headers.get("X-Degradation-Tier")
+        except requests.RequestException:
+            ok, tier = False, None
+        return time.perf_counter() - started, ok, tier
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, urls))
+    elapsed = time.perf_counter() - started
+    latencies = [seconds * 1000 for seconds, _, _ in samples]
+    tiers = {}
+    for _, _, tier in samples:
+        if tier:
+            tiers[tier] = tiers.get(tier, 0) + 1
+    return {"requests": count, "errors": sum(1 for _, ok, _ in samples if not ok), "rps": count / elapsed,
+            "degraded": sum(n for tier, n in tiers.items() if tier != "full"), "tiers": tiers,
+            "mean_ms": statistics.mean(latencies), "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95), "p99_ms": percentile(latencies, 99)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--types", default=",".join(SEARCH_TYPES))
+    parser.add_argument("--queries", default="solar panels,heat pumps,grid storage")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="measured requests per search type")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured passes over every query and page first")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--sites", type=int, default=4, help="local fixture servers standing in for upstream hosts")
+    parser.add_argument("--kbps", type=int, default=0, help="throttle fixture page bodies")
+    parser.add_argument("--search-latency", type=float, default=0.0, help="seconds added to each replayed DDGS call")
+    parser.add_argument("--admission", action="store_true", help="keep admission control on in the workers")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--record", metavar="QUERY", help="refresh fixtures/ddgs from live DDGS and exit")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--bases", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args)
+    if args.record:
+        return record(args.record)
+
+    search_types = args.types.split(",")
+    queries = [requests.utils.quote(q) for q in args.queries.split(",")]
+    bases = [start_fixture_server(kbps=args.kbps)[1] for _ in range(args.sites)]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        workers = start_workers(args.workers, bases, args.search_latency, cache_dir, args.admission)
+        try:
+            for _ in range(args.warmup):
+                for search_type in search_types:
+                    drive(workers, search_type, queries, len(queries) * 3 * len(workers), args.concurrency)
+            sampler = RSSSampler([process.pid for process, _ in workers])
+            sampler.sample()
+            sampler.start()
+            report = {"config": {key: value for key, value in vars(args).items() if key not in ("serve", "port", "bases")},
+                      "types": {}}
+            print(f"{'type':<10} {'reqs':>6} {'errors':>6} {'degraded':>8} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+            for search_type in search_types:
+                result = drive(workers, search_type, queries, args.requests, args.concurrency)
+                report["types"][search_type] = result
+                print(f"{search_type:<10} {result['requests']:>6} {result['errors']:>6} {result['degraded']:>8} {result['rps']:>8.1f} "
+                      f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+            sampler.stopped.set()
+            sampler.sample()
+            report["peak_rss_mb"] = [sampler.peak[process.pid] for process, _ in workers]
+            for i, rss in enumerate(report["peak_rss_mb"]):
+                print(f"worker {i} peak RSS: {rss:.1f} MB" if rss is not None else f"worker {i} peak RSS: unavailable")
+        finally:
+            for process, _ in workers:
+                process.terminate()
+                process.wait()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Accuracy and speed of price/image extraction on the saved pages.
+
+Each page in benchmarks/fixtures/expected.json is given a URL on its own
+domain and checked against the expected price and image. Modes:
+
+  original     the previous DOM scan: every price-classed tag tried against
+               each pattern in turn, then two passes over <img>
+  engine-cold  app.extract_product, starting every pass with no learned
+               per-domain rules (a later page can still use a rule learned
+               from an earlier page on the same domain)
+  engine-warm  the same, with the rules from a previous pass kept
+  stream-cold  app.StreamingExtractor + Document.from_extractor, no rules
+  stream-warm  the same, with the rules kept
+
+The original and engine modes time extraction only, on an already parsed
+soup. The stream modes time the whole incremental parse, because there the
+extraction is part of it.
+
+Usage: python benchmarks/product_extraction_bench.py [--repeat 50]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+import app
+from fixture_server import FIXTURES, PAGES
+
+def original_price_and_image(soup, url, meta, json_ld):
+    price = "Price not found"
+    for tag in soup.find_all(['span', 'div', 'p'], class_=app.PRICE_CLASSES):
+        text = tag.get_text().strip()
+        for pattern in app.PRICE_PATTERNS:
+            match = re.search(pattern, text)
+            if match:
+                price = match.group()
+                break
+        if price != "Price not found":
+            break
+    image = app.PLACEHOLDER_IMAGE
+    for img in soup.find_all('img', class_=app.IMAGE_CLASSES):
+        if img.get('src'):
+            image = app.absolute_image_url(img['src'], url)
+            break
+    else:
+        for img in soup.find_all('img'):
+            alt = str(img.get('alt', '')).lower()
+            if any(keyword in alt for keyword in app.IMAGE_ALT_KEYWORDS):
+                image = app.absolute_image_url(img.get('src', app.PLACEHOLDER_IMAGE), url)
+                break
+    return price, image
+
+def stream_price_and_image(html, url):
+    rule = app.extraction_rules.get(urlparse(url).netloc)
+    extractor = app.StreamingExtractor(url, rule=rule)
+    extractor.feed(html)
+    extractor.close()
+    doc = app.Document.from_extractor(url, extractor)
+    return doc.price, doc.image
+
+def image_matches(image, accepted):
+    return any(image == a or (a.startswith("/") and urlparse(image).path == a) for a in accepted)
+
+def reset_rules():
+    app.extraction_rules = app.MemoryCache("extraction_rules", app.EXTRACTION_RULES_MAX_BYTES)
+
+def run_mode(name, pages, repeat, stream, extract=None):
+    # One pass per repeat over every page, in order, so later pages on a
+    # domain can use rules learned from earlier ones in the same pass.
+    correct_price = correct_image = 0
+    samples = []
+    for attempt in range(repeat):
+        if name.endswith("cold"):
+            reset_rules()
+        for page in pages:
+            started = time.perf_counter()
+            if stream:
+                price, image = stream_price_and_image(page["html"], page["url"])
+            else:
+                price, image = extract(page["soup"], page["url"], page["meta"], page["json_ld"])
+            samples.append((time.perf_counter() - started) * 1000)
+            if attempt == 0:
+                correct_price += price == page["price"]
+                correct_image += image_matches(image, page["image"])
+                if price != page["price"] or not image_matches(image, page["image"]):
+                    print(f"  {name}: {page['name']} got {price!r}, {image!r}")
+    return correct_price, correct_image, statistics.mean(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES, "expected.json")) as f:
+        expected = json.load(f)
+    pages = []
+    for name, want in expected.items():
+        with open(os.path.join(PAGES, name), encoding="utf-8") as f:
+            html = f.read()
+        soup = BeautifulSoup(html, app.HTML_PARSER)
+        meta = {}
+        for tag in soup.find_all("meta"):
+            key = tag.get("property") or tag.get("name")
+            if key and tag.get("content"):
+                meta.setdefault(key.lower(), tag["content"])
+        json_ld = [tag.string or "" for tag in soup.find_all("script", type="application/ld+json")]
+        pages.append(dict(want, name=name, html=html, soup=soup, meta=meta, json_ld=json_ld,
+                          url=f"https://{want['domain']}/{name}"))
+
+    def engine(soup, url, meta, json_ld):
+        return app.extract_product(soup, url, meta, json_ld)
+
+    results = []
+    results.append(("original",) + run_mode("original", pages, args.repeat, False, original_price_and_image))
+    results.append(("engine-cold",) + run_mode("engine-cold", pages, args.repeat, False, engine))
+    reset_rules()
+    run_mode("learn", pages, 1, False, engine)
+    results.append(("engine-warm",) + run_mode("engine-warm", pages, args.repeat, False, engine))
+    results.append(("stream-cold",) + run_mode("stream-cold", pages, args.repeat, True))
+    reset_rules()
+    run_mode("learn", pages, 1, True)
+    results.append(("stream-warm",) + run_mode("stream-warm", pages, args.repeat, True))
+
+    print(f"\n{'mode':<12} {'price ok':>9} {'image ok':>9} {'ms/page':>9}")
+    for name, price_ok, image_ok, mean_ms in results:
+        print(f"{name:<12} {price_ok:>5}/{len(pages):<3} {image_ok:>5}/{len(pages):<3} {mean_ms:>9.3f}")
+
+if __name__ == "__main__":
+    main()
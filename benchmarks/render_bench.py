@@ -0,0 +1,71 @@
+"""Render time of the results page for each search type.
+
+Renders templates/results.html with a synthetic page of 10 hits (5 top
+stories for the stories tab) two ways:
+
+  string    compile the template source on every call, which is what the old
+            render_template_string path did
+  cached    render_template with the template precompiled at startup
+
+No network or model is involved; only the Jinja render is timed.
+
+Usage: python benchmarks/render_bench.py [--repeat 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template
+
+import app
+
+SEARCH_TYPES = ["text", "news", "image", "video", "shopping", "stories"]
+
+def make_context(search_type):
+    hits = []
+    for i in range(10):
+        url = f"https://site{i % 4}.example/article-{i}"
+        hits.append({"title": f"Result {i}", "href": url, "url": url, "body": "Lorem ipsum dolor sit amet. " * 8,
+                     "date": "2024-05-01T12:00:00+00:00", "source": f"site{i % 4}.example",
+                     "image": f"https://site{i % 4}.example/image-{i}.jpg", "thumbnail": app.PLACEHOLDER_IMAGE,
+                     "content": url, "duration": "3:21", "publisher": "Example", "price": "$19.99",
+                     "favicon": app.fallback_favicon_url(url)})
+    stories = []
+    if search_type == "stories":
+        for hit in hits[:5]:
+            stories.append(dict(hit, website=app.get_website_name(hit["url"]), summary=hit["body"]))
+    return dict(query="benchmark", search_type=search_type, news_category=None, page_results=hits, page=1,
+                total_pages=10, start_idx=0, summary="A short summary of the results." * 3, summary_job=None,
+                top_stories=stories, streaming=False)
+
+def time_renders(render, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.mean(samples), statistics.quantiles(samples, n=20)[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(os.path.join(app.app.root_path, "templates", "results.html")) as f:
+        source = f.read()
+
+    print(f"{'type':<10} {'string ms':>10} {'p95':>8} {'cached ms':>10} {'p95':>8} {'speedup':>8}")
+    with app.app.test_request_context("/results"):
+        for search_type in SEARCH_TYPES:
+            context = make_context(search_type)
+            string_mean, string_p95 = time_renders(lambda: app.app.jinja_env.from_string(source).render(**context), args.repeat)
+            cached_mean, cached_p95 = time_renders(lambda: render_template("results.html", **context), args.repeat)
+            print(f"{search_type:<10} {string_mean:>10.3f} {string_p95:>8.3f} {cached_mean:>10.3f} {cached_p95:>8.3f} "
+                  f"{string_mean / cached_mean:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import re
+from collections import Counter
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+def f1(overlap, candidate_total, reference_total):
+    if not overlap:
+        return 0.0
+    precision = overlap / candidate_total
+    recall = overlap / reference_total
+    return 2 * precision * recall / (precision + recall)
+
+def rouge_n(candidate, reference, n=1):
+    def grams(tokens):
+        return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    cand, ref = grams(tokenize(candidate)), grams(tokenize(reference))
+    return f1(sum((cand & ref).values()), sum(cand.values()), sum(ref.values()))
+
+def rouge_l(candidate, reference):
+    cand, ref = tokenize(candidate), tokenize(reference)
+    if not cand or not ref:
+        return 0.0
+    previous = [0] * (len(ref) + 1)
+    for token in cand:
+        current = [0]
+        for j, other in enumerate(ref):
+            current.append(previous[j] + 1 if token == other else max(previous[j + 1], current[j]))
+        previous = current
+    return f1(previous[-1], len(cand), len(ref))
+
+def rouge_scores(candidate, reference):
+    return {"rouge1": rouge_n(candidate, reference, 1), "rouge2": rouge_n(candidate, reference, 2),
+            "rougeL": rouge_l(candidate, reference)}
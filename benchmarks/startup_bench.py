@@ -0,0 +1,59 @@
+"""Cold-start cost of the app under each SUMMARIZER_WARMUP mode.
+
+Each mode runs in a fresh subprocess, the way a new gunicorn worker would.
+For each mode it reports the time to import app, the time until the first
+response from / (the index page) and the time until /readyz returns 200.
+A "background" worker starts loading the model on that first request.
+A "lazy" worker reports ready straight away and pays for the model load on
+its first summary instead, which this benchmark does not measure.
+
+Usage: python benchmarks/startup_bench.py [--modes eager,background,lazy] [--timeout 300]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def worker(timeout):
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import app
+    imported = time.perf_counter() - started
+    client = app.app.test_client()
+    client.get("/")
+    first_response = time.perf_counter() - started
+    ready = None
+    while time.perf_counter() - started < timeout:
+        if client.get("/readyz").status_code == 200:
+            ready = time.perf_counter() - started
+            break
+        time.sleep(0.05)
+    json.dump({"import": imported, "first_response": first_response, "ready": ready}, sys.stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="eager,background,lazy")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args.timeout)
+
+    print(f"{'mode':<11} {'import s':>9} {'first / s':>10} {'ready s':>9}")
+    for mode in args.modes.split(","):
+        env = dict(os.environ, SUMMARIZER_WARMUP=mode)
+        proc = subprocess.run([sys.executable, __file__, "--worker", "--timeout", str(args.timeout)],
+                              env=env, capture_output=True, text=True)
+        if proc.returncode:
+            print(f"{mode}: failed\n{proc.stderr[-2000:]}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        ready = f"{result['ready']:.2f}" if result["ready"] is not None else "-"
+        print(f"{mode:<11} {result['import']:>9.2f} {result['first_response']:>10.2f} {ready:>9}")
+
+if __name__ == "__main__":
+    main()
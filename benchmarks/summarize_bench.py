@@ -0,0 +1,55 @@
+"""Throughput of per-item summarization vs. the SummaryBatcher.
+
+Sends the texts in benchmarks/fixtures/articles.json through the summarizer
+from --concurrency client threads. The first run calls the pipeline once per
+text (the SUMMARY_BATCHING=0 path). The second run goes through a
+SummaryBatcher, as concurrent requests would with SUMMARY_BATCHING=1. Each run
+reports summaries/sec. The summary cache is not involved.
+
+Usage: python benchmarks/summarize_bench.py [--concurrency 8] [--rounds 2]
+                                            [--batch-size 8] [--wait 0.02]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+ARTICLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "articles.json")
+
+def load_texts():
+    with open(ARTICLES) as f:
+        return [article["text"] for article in json.load(f)]
+
+def measure(name, fn, texts, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        list(pool.map(fn, texts))
+        elapsed = time.perf_counter() - started
+    print(f"{name:<10} {len(texts):>6} {elapsed:>10.2f} {len(texts) / elapsed:>14.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=app.SUMMARY_BATCH_SIZE)
+    parser.add_argument("--wait", type=float, default=app.SUMMARY_BATCH_WAIT)
+    args = parser.parse_args()
+
+    texts = load_texts() * args.rounds
+    app.run_summarizer(texts[0])
+    batcher = app.SummaryBatcher(app.run_summarizer_batch, args.batch_size, args.wait)
+
+    print(f"{'path':<10} {'texts':>6} {'seconds':>10} {'summaries/s':>14}")
+    measure("per-item", app.run_summarizer, texts, args.concurrency)
+    measure("batched", lambda text: batcher.submit(text).result(), texts, args.concurrency)
+    stats = batcher.stats()
+    print(f"batches={stats['batches']} mean_batch_size={stats['mean_batch_size']:.1f}")
+
+if __name__ == "__main__":
+    main()